@@ -1,21 +1,30 @@
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from datetime import datetime
 import uvicorn
 from web3 import Web3
+import asyncio
+import contextvars
 import json
 import os
 from pathlib import Path
 import re
-import random
-import requests
-from requests_toolbelt.multipart.encoder import MultipartEncoder
+import uuid
 from dotenv import load_dotenv
-from PIL import Image, ImageDraw, ImageFont
-import qrcode
 from collections import OrderedDict
+from nonce_manager import NonceManager
+from mint_queue import MintQueue
+from token_ledger import TokenLedger
+from badge_records import BadgeRecordStore
+from team_index import TeamIndex
+from quiz_sessions import QuizSession, create_session_store
+from quiz_bank import QuizBank
+from certificate_service import CertificateService, CertificateQueueFull
+from upload_outbox import UploadOutbox, COMPLETE, PENDING
+from pinata_client import AsyncPinataClient, DEFAULT_UPLOAD_URL, DEFAULT_API_URL
 
 load_dotenv()
 
@@ -38,16 +47,52 @@ localRPC = "http://127.0.0.1:8545"
 pinataJWT = os.getenv("PINATA_JWT")
 pinataBaseURL = os.getenv("PINATA_BASE_URL")
 pinataLegacyURL = os.getenv("PINATA_LEGACY_URL")
+PINATA_UPLOAD_URL = os.getenv("PINATA_UPLOAD_URL", DEFAULT_UPLOAD_URL)
+PINATA_API_URL = os.getenv("PINATA_API_URL", DEFAULT_API_URL)
+PINATA_REQUESTS_PER_MINUTE = int(os.getenv("PINATA_REQUESTS_PER_MINUTE", "60"))  # match the Pinata plan
 
 # Constants
 STUDENT_BADGE_DATA = "./StudentBadges/StudentBadgeData.json"
+BADGE_RECORDS_DB = "./StudentBadges/badge_records.db"
+TOKEN_LEDGER_DB = "./StudentBadges/token_ledger.db"
 TOKENS_PER_CORRECT_ANSWER = 50
 MINIMUM_TOKENS_FOR_NFT = 10
 QUIZ_QUESTIONS_FILE = "quiz_questions.json"
+QUIZ_QUESTIONS_PER_SESSION = 5
+QUIZ_TOPIC_WEIGHTS = None  # e.g. {"Intellectual Property": 3, "Blockchain": 1} to favour topics
+QUIZ_STRATIFIED_SAMPLING = False  # True to draw from each topic in proportion to its size
+QUIZ_SESSION_BACKEND = os.getenv("QUIZ_SESSION_BACKEND", "memory")  # "sqlite" to share sessions between workers
+QUIZ_SESSION_DB = "./StudentBadges/quiz_sessions.db"
+QUIZ_SESSION_TTL = 3600  # seconds of inactivity before a quiz session expires
+QUIZ_MAX_SESSIONS = 50000
+# Certificates are uploaded from memory; set this to also keep a copy of each PNG on disk
+CERTIFICATE_ARCHIVE_DIR = os.getenv("CERTIFICATE_ARCHIVE_DIR")
+# Certificate QR codes point here (plus the record id); /certificate/{id} redirects to the pinned metadata.
+# The link is printed into every certificate and pinned for good, so it must be the API's public
+# address (e.g. https://badges.example.edu/certificate), never a loopback one.
+CERTIFICATE_RESOLVER_URL = os.getenv("CERTIFICATE_RESOLVER_URL", "").rstrip("/")
+if not CERTIFICATE_RESOLVER_URL:
+    raise RuntimeError("CERTIFICATE_RESOLVER_URL is not set: give the public URL of this API's /certificate route")
+UPLOAD_OUTBOX_DB = "./StudentBadges/upload_outbox.db"
+MINT_JOBS_DB = "./StudentBadges/mint_jobs.db"
+UPLOAD_OUTBOX_DIR = "./StudentBadges/outbox"
+PINATA_GATEWAY_URL = "https://gateway.pinata.cloud/ipfs"
+
+# Tokens needed for each badge tier, also the thresholds the ledger keeps eligibility counts for.
+# Keep in step with StudentNFTAPI.py, which shares the ledger database.
+BADGE_TOKEN_REQUIREMENTS = {
+    "Newbie": 10,
+    "Amateur": 30,
+    "Intermediate": 50,
+    "Pro": 75,
+    "entrePROneur": 100
+}
+# Clients send a unique value in this header to make ledger-changing requests safe to retry
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENT_ROUTES = {"/submit_answer", "/submit_answers", "/mintBadge", "/admin_add_tokens"}
 
 # Initialize Web3
 web3 = Web3(Web3.HTTPProvider(localRPC))
-assert web3.is_connected()
 
 # Load contract ABI
 with open("D:/Internship/CIE/IgniteChain/Solidity/artifacts/contracts/StudentBadgeNFT.sol/StudentBadgeNFT.json") as f:
@@ -58,25 +103,35 @@ contract = web3.eth.contract(
     abi=abi
 )
 
-# Quiz questions
-QUIZ_QUESTIONS = [
-    {
-        "id": 1,
-        "question": "What is intellectual property (IP)?",
-        "options": [
-            "A physical asset owned by a company",
-            "A set of legal rights over creations of the mind",
-            "A form of tangible property like land or machinery",
-            "A type of government regulation on businesses"
-        ],
-        "correct_answer": 1
-    },
-    # ... (rest of your quiz questions)
-]
-
-# In-memory storage
-user_sessions = {}
-user_tokens = {}
+# Nonces for the minting signer are allocated locally so writes can be pipelined
+nonce_manager = NonceManager(web3, accountAddress, privateKey)
+
+# Questions come from QUIZ_QUESTIONS_FILE and are reloaded when the file changes
+quiz_bank = QuizBank(QUIZ_QUESTIONS_FILE)
+
+# Badge records are appended to an indexed store; the legacy JSON file is imported at startup
+badge_records = BadgeRecordStore(BADGE_RECORDS_DB)
+
+# Team lookups are served from memory; the index only pulls newly appended records
+team_index = TeamIndex(badge_records)
+
+# Connecting, importing and starting threads wait for startup rather than import time:
+# certificate worker processes re-import this module
+@app.on_event("startup")
+async def load_badge_records():
+    assert await run_blocking(web3.is_connected)
+    await run_blocking(badge_records.import_json, STUDENT_BADGE_DATA)
+    await run_blocking(team_index.refresh)
+    team_index.start()
+
+# Quiz sessions expire after QUIZ_SESSION_TTL and hold question ids only; token balances live in the SQLite ledger
+quiz_sessions = create_session_store(
+    QUIZ_SESSION_BACKEND,
+    db_path=QUIZ_SESSION_DB,
+    ttl=QUIZ_SESSION_TTL,
+    max_sessions=QUIZ_MAX_SESSIONS
+)
+ledger = TokenLedger(TOKEN_LEDGER_DB, tiers=BADGE_TOKEN_REQUIREMENTS.values())
 
 # Models
 class TeamMember(BaseModel):
@@ -110,110 +165,166 @@ class QuizAnswer(BaseModel):
     session_id: str
     answer: int
 
-# Utility functions
-def get_nonce(address):
-    return web3.eth.get_transaction_count(address)
+class QuizAnswers(BaseModel):
+    session_id: str
+    answers: List[int]  # 0-based option index per question, in question order
 
+# Utility functions
 def initialize_user_tokens(user_address, initial_tokens=10000):
-    if user_address not in user_tokens:
-        user_tokens[user_address] = initial_tokens
-    return user_tokens[user_address]
+    return ledger.initialize(user_address, initial_tokens)
 
 def get_user_tokens(user_address):
-    return user_tokens.get(user_address, 0)
-
-def add_tokens(user_address, amount):
-    if user_address not in user_tokens:
-        user_tokens[user_address] = 0
-    user_tokens[user_address] += amount
-    return user_tokens[user_address]
-
-def deduct_tokens(user_address, amount):
-    if user_address not in user_tokens:
-        return False
-    if user_tokens[user_address] < amount:
-        return False
-    user_tokens[user_address] -= amount
-    return True
+    return ledger.get(user_address)
+
+def add_tokens(user_address, amount, request_key=None):
+    return ledger.credit(user_address, amount, request_key=request_key)
+
+def deduct_tokens(user_address, amount, request_key=None):
+    return ledger.debit(user_address, amount, request_key=request_key)
+
+def refund_tokens(user_address, amount, request_key=None):
+    return ledger.refund(user_address, amount, request_key=request_key)
+
+# Idempotency key of the request being handled, set by the idempotency middleware
+current_request_key = contextvars.ContextVar("current_request_key", default=None)
+
+# Background mint worker, refunds go back through refund_tokens. Mints arriving within
+# batch_window seconds share one mintBadgeBatch transaction when the contract has it.
+# Jobs are kept in MINT_JOBS_DB, so queued mints survive a restart and any worker can report on them.
+mint_queue = MintQueue(
+    web3, contract, nonce_manager, MINT_JOBS_DB,
+    refund=refund_tokens,
+    batch_size=25,
+    batch_window=0.25
+)
 
 def sanitize_filename(text):
     return re.sub(r'[^\w\-]', '_', text)
 
-# Pinata functions
-async def upload_file_to_pinata(file_path: str):
-    if not os.path.isfile(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
+# Pinata functions; uploads run on a pooled httpx.AsyncClient so they never block the event loop
+pinata = AsyncPinataClient(
+    pinataJWT,
+    upload_url=PINATA_UPLOAD_URL,
+    api_url=PINATA_API_URL,
+    requests_per_minute=PINATA_REQUESTS_PER_MINUTE
+)
 
-    with open(file_path, "rb") as file_obj:
-        m = MultipartEncoder(
-            fields={"file": (os.path.basename(file_path), file_obj)}
-        )
-        headers = {
-            "Authorization": f"Bearer {pinataJWT}",
-            "Content-Type": m.content_type
-        }
-        response = requests.post(
-            "https://api.pinata.cloud/pinning/pinFileToIPFS",
-            headers=headers,
-            data=m
-        )
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Pinata upload failed")
-        return response.json()["IpfsHash"]
-
-async def upload_metadata_to_pinata(metadata: dict):
-    headers = {
-        "Authorization": f"Bearer {pinataJWT}",
-        "Content-Type": "application/json"
-    }
-    response = requests.post(
-        "https://api.pinata.cloud/pinning/pinJSONToIPFS",
-        json=metadata,
-        headers=headers
+@app.on_event("shutdown")
+async def close_pinata():
+    await pinata.aclose()
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking web3 / SQLite / disk call on a worker thread instead of the event loop"""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+@app.middleware("http")
+async def idempotency(request: Request, call_next):
+    """
+    Make the IDEMPOTENT_ROUTES safe to retry. A request carrying an
+    Idempotency-Key header runs once; repeats get the stored response back, or
+    409 while the first one is still running. Endpoints pass
+    current_request_key to their ledger mutation so a retry that takes over a
+    stalled request does not move the balance twice. 5xx responses are not
+    stored and may be retried.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key or request.method != "POST" or request.url.path not in IDEMPOTENT_ROUTES:
+        return await call_next(request)
+    if len(key) > 255:
+        return JSONResponse(status_code=400, content={"detail": f"{IDEMPOTENCY_HEADER} must be at most 255 characters"})
+
+    request_key = f"{request.url.path}:{key}"
+    owner, stored = await run_blocking(ledger.claim_request, request_key)
+    if not owner:
+        if stored is None:
+            return JSONResponse(status_code=409, content={"detail": "A request with this Idempotency-Key is still being processed"})
+        return JSONResponse(status_code=stored["status"], content=stored["body"], headers={"Idempotent-Replayed": "true"})
+
+    token = current_request_key.set(request_key)
+    try:
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+    except BaseException:
+        await run_blocking(ledger.release_request, request_key)
+        raise
+    finally:
+        current_request_key.reset(token)
+
+    if response.status_code < 500 and response.headers.get("content-type") == "application/json":
+        await run_blocking(ledger.finish_request, request_key, {"status": response.status_code, "body": json.loads(body)})
+    else:
+        await run_blocking(ledger.release_request, request_key)
+    return Response(content=body, status_code=response.status_code, headers=dict(response.headers))
+
+# Certificate generation runs on worker processes so it never blocks the event loop
+certificate_service = CertificateService(name_anchor="mm")
+
+async def generate_certificate(name: str, team_name: str, branch: str, link: str, badge_name: str) -> bytes:
+    return await certificate_service.encode_async(name, team_name, branch, link, badge_name)
+
+def archive_certificate(png_bytes: bytes, file_name: str):
+    if not CERTIFICATE_ARCHIVE_DIR:
+        return None
+    os.makedirs(CERTIFICATE_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(CERTIFICATE_ARCHIVE_DIR, file_name)
+    with open(path, "wb") as f:
+        f.write(png_bytes)
+    return path
+
+async def pin_certificate_image(png_bytes: bytes, file_name: str) -> str:
+    return await pinata.pin_file(png_bytes, file_name, content_type="image/png")
+
+def build_certificate_metadata(template: dict, image_cid: str) -> dict:
+    return dict(template, image=f"ipfs://{image_cid}")
+
+def complete_certificate_upload(task: dict):
+    badge_records.update(
+        task["record_id"],
+        metadata_uri=f"{PINATA_GATEWAY_URL}/{task['metadata_cid']}",
+        certificate_url=f"{PINATA_GATEWAY_URL}/{task['image_cid']}",
+        status="complete"
     )
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Metadata upload failed")
-    return response.json()["IpfsHash"]
-
-# Certificate generation
-def generate_certificate(output_file: str, name: str, team_name: str, 
-                        branch: str, link: str, badge_name: str):
-    base_dir = Path(__file__).parent
-    font_path = base_dir / "fonts" / "dejavu-sans-webfont.ttf"
-    template_path = base_dir / "certificate_of_achievement.png"
-
-    if not font_path.exists():
-        raise FileNotFoundError(f"Font not found at {font_path}")
-    if not template_path.exists():
-        raise FileNotFoundError("Certificate template not found")
-
-    image = Image.open(template_path)
-    draw = ImageDraw.Draw(image)
-    text_color = (255, 255, 255)
-    current_date = datetime.now().strftime("%B %d, %Y")
-
-    # Fonts and positions (adjust as needed)
-    name_font = ImageFont.truetype(str(font_path), 45)
-    team_font = ImageFont.truetype(str(font_path), 20)
-    date_font = ImageFont.truetype(str(font_path), 35)
-    badge_font = ImageFont.truetype(str(font_path), 30)
-
-    # Draw text
-    draw.text((image.width//2, 680), name.title(), font=name_font, fill=text_color, anchor="mm")
-    draw.text((728, 780), team_name.title(), font=team_font, fill=text_color)
-    draw.text((680, 812), branch.upper(), font=team_font, fill=text_color)
-    draw.text((467, 985), current_date, font=date_font, fill=text_color)
-    draw.text((745, 528), badge_name, font=badge_font, fill=text_color)
-
-    # QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(link)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color='white', back_color=(54, 151, 193))
-    qr_img = qr_img.resize((250, 250))
-    image.paste(qr_img, (1145, 580))
-
-    image.save(output_file)
+    team_index.refresh()
+
+def fail_certificate_upload(task: dict):
+    """Out of retries: drop the reserved record so the resolver stops pointing at it"""
+    badge_records.delete(task["record_id"])
+
+def upload_task_status(task: dict) -> dict:
+    status = {
+        "task_id": task["task_id"],
+        "status": task["status"],
+        "attempts": task["attempts"],
+        "last_error": task["last_error"],
+        "certificate_link": f"{CERTIFICATE_RESOLVER_URL}/{task['record_id']}"
+    }
+    if task["status"] == COMPLETE:
+        status["metadata_uri"] = f"{PINATA_GATEWAY_URL}/{task['metadata_cid']}"
+        status["certificate_url"] = f"{PINATA_GATEWAY_URL}/{task['image_cid']}"
+    return status
+
+# Certificate uploads go through a durable outbox: a Pinata failure leaves the rendered PNG
+# and any finished pins on disk for the drainer to resume on the event loop
+upload_outbox = UploadOutbox(
+    UPLOAD_OUTBOX_DB,
+    UPLOAD_OUTBOX_DIR,
+    pin_image=pin_certificate_image,
+    pin_metadata=pinata.pin_json,
+    build_metadata=build_certificate_metadata,
+    on_complete=complete_certificate_upload,
+    on_failed=fail_certificate_upload
+)
+upload_outbox_drainer = None
+
+@app.on_event("startup")
+async def start_upload_outbox():
+    global upload_outbox_drainer
+    upload_outbox_drainer = asyncio.create_task(upload_outbox.run_async())
+
+@app.on_event("startup")
+async def start_mint_queue():
+    # Resumes mints a previous run queued or sent but never saw confirmed
+    mint_queue.start()
 
 # Endpoints
 @app.post("/initialize_user")
@@ -221,7 +332,7 @@ async def initialize_user(data: dict):
     user_address = data.get("user_address")
     if not user_address:
         raise HTTPException(status_code=400, detail="User address is required")
-    tokens = initialize_user_tokens(user_address)
+    tokens = await run_blocking(initialize_user_tokens, user_address)
     return {
         "user_address": user_address,
         "tokens": tokens,
@@ -230,7 +341,7 @@ async def initialize_user(data: dict):
 
 @app.get("/get_user_balance/{user_address}")
 async def get_user_balance(user_address: str):
-    tokens = get_user_tokens(user_address)
+    tokens = await run_blocking(get_user_tokens, user_address)
     return {"user_address": user_address, "tokens": tokens}
 
 @app.post("/start_quiz")
@@ -239,56 +350,135 @@ async def start_quiz(data: dict):
     if not user_address:
         raise HTTPException(status_code=400, detail="User address is required")
     
-    initialize_user_tokens(user_address)
-    session_id = f"{user_address}_{datetime.now().timestamp()}"
-    user_sessions[session_id] = {
-        "user_address": user_address,
-        "questions": random.sample(QUIZ_QUESTIONS, min(5, len(QUIZ_QUESTIONS))),
-        "current_question": 0,
-        "correct_answers": 0,
-        "total_questions": min(5, len(QUIZ_QUESTIONS)),
-        "started_at": datetime.now().isoformat()
-    }
-    return {
-        "session_id": session_id,
-        "total_questions": user_sessions[session_id]["total_questions"],
+    await run_blocking(initialize_user_tokens, user_address)
+    question_ids = quiz_bank.sample(
+        QUIZ_QUESTIONS_PER_SESSION,
+        topic_weights=QUIZ_TOPIC_WEIGHTS,
+        stratified=QUIZ_STRATIFIED_SAMPLING
+    )
+    session = QuizSession.new(user_address, question_ids)
+    await run_blocking(quiz_sessions.save, session)
+    response = {
+        "session_id": session.session_id,
+        "total_questions": session.total_questions,
         "message": "Quiz session started successfully"
     }
+    # Batch mode: hand out every question now and take the answers through /submit_answers
+    if data.get("include_questions"):
+        response["questions"] = quiz_questions_for(session)
+    return response
+
+def quiz_questions_for(session: QuizSession) -> List[dict]:
+    """A session's questions without their answers, in the order /submit_answers expects"""
+    questions = []
+    for number, question_id in enumerate(session.question_ids, start=1):
+        question = quiz_bank.get(question_id)
+        if question is not None:
+            questions.append({
+                "question_id": question_id,
+                "question_number": number,
+                "question": question["question"],
+                "options": question["options"]
+            })
+    return questions
 
 @app.post("/submit_answer")
 async def submit_answer(answer: QuizAnswer):
-    session = user_sessions.get(answer.session_id)
+    session = await run_blocking(quiz_sessions.get, answer.session_id)
     if not session:
         raise HTTPException(status_code=400, detail="Invalid session ID")
+    if session.completed:
+        raise HTTPException(status_code=400, detail="Quiz completed")
     
-    current_q = session["questions"][session["current_question"]]
+    current_q = quiz_bank.get(session.current_question_id)
+    if current_q is None:
+        raise HTTPException(status_code=409, detail="This question was removed from the quiz bank, please start a new quiz")
     is_correct = answer.answer == current_q["correct_answer"]
     
+    # Move the session on before paying, and only if no concurrent request already did
+    answered = session.current_question
+    session.current_question += 1
+    if is_correct:
+        session.correct_answers += 1
+    if not await run_blocking(quiz_sessions.save_if, session, answered):
+        raise HTTPException(status_code=409, detail="This question was already answered")
+
     if is_correct:
-        session["correct_answers"] += 1
-        add_tokens(session["user_address"], TOKENS_PER_CORRECT_ANSWER)
+        await run_blocking(add_tokens, session.user_address, TOKENS_PER_CORRECT_ANSWER,
+                           request_key=current_request_key.get())
     
-    session["current_question"] += 1
-    quiz_completed = session["current_question"] >= len(session["questions"])
+    quiz_completed = session.completed
+    total_tokens = await run_blocking(get_user_tokens, session.user_address)
     
     response = {
         "correct": is_correct,
         "correct_answer": current_q["correct_answer"],
         "tokens_earned": TOKENS_PER_CORRECT_ANSWER if is_correct else 0,
-        "total_tokens": get_user_tokens(session["user_address"]),
+        "total_tokens": total_tokens,
         "quiz_completed": quiz_completed
     }
     
     if quiz_completed:
         response.update({
-            "final_score": f"{session['correct_answers']}/{session['total_questions']}",
-            "total_tokens_earned": session["correct_answers"] * TOKENS_PER_CORRECT_ANSWER,
-            "can_mint_nft": get_user_tokens(session["user_address"]) >= MINIMUM_TOKENS_FOR_NFT
+            "final_score": f"{session.correct_answers}/{session.total_questions}",
+            "total_tokens_earned": session.correct_answers * TOKENS_PER_CORRECT_ANSWER,
+            "can_mint_nft": total_tokens >= MINIMUM_TOKENS_FOR_NFT
         })
     
     return response
 
-@app.post("/mintBadge")
+@app.post("/submit_answers")
+async def submit_answers(submission: QuizAnswers):
+    """Score all remaining answers of a session at once and credit the tokens in one ledger write"""
+    session = await run_blocking(quiz_sessions.get, submission.session_id)
+    if not session:
+        raise HTTPException(status_code=400, detail="Invalid session ID")
+    if len(submission.answers) != session.total_questions:
+        raise HTTPException(status_code=400, detail=f"Expected {session.total_questions} answers")
+    if session.completed:
+        raise HTTPException(status_code=400, detail="Quiz completed")
+
+    # Questions already answered through /submit_answer keep their result
+    results = []
+    correct = 0
+    for position in range(session.current_question, session.total_questions):
+        question_id = session.question_ids[position]
+        question = quiz_bank.get(question_id)
+        if question is None:
+            raise HTTPException(status_code=409, detail="A question was removed from the quiz bank, please start a new quiz")
+        is_correct = submission.answers[position] == question["correct_answer"]
+        correct += is_correct
+        results.append({
+            "question_id": question_id,
+            "correct": is_correct,
+            "correct_answer": question["correct_answer"]
+        })
+
+    # Only one request may complete the session and be paid for it
+    answered = session.current_question
+    session.correct_answers += correct
+    session.current_question = session.total_questions
+    if not await run_blocking(quiz_sessions.save_if, session, answered):
+        raise HTTPException(status_code=409, detail="This quiz was already submitted")
+
+    tokens_earned = correct * TOKENS_PER_CORRECT_ANSWER
+    if tokens_earned:
+        total_tokens = await run_blocking(add_tokens, session.user_address, tokens_earned,
+                                          request_key=current_request_key.get())
+    else:
+        total_tokens = await run_blocking(get_user_tokens, session.user_address)
+
+    return {
+        "results": results,
+        "tokens_earned": tokens_earned,
+        "total_tokens": total_tokens,
+        "quiz_completed": True,
+        "final_score": f"{session.correct_answers}/{session.total_questions}",
+        "total_tokens_earned": session.correct_answers * TOKENS_PER_CORRECT_ANSWER,
+        "can_mint_nft": total_tokens >= MINIMUM_TOKENS_FOR_NFT
+    }
+
+@app.post("/mintBadge", status_code=202)
 async def mint_badge(request: MintRequest):
     BADGE_COST = {
         "Newbie": 10,
@@ -302,7 +492,7 @@ async def mint_badge(request: MintRequest):
     if not required_tokens:
         raise HTTPException(status_code=400, detail=f"Invalid badge type: {request.badge_type}")
     
-    current_tokens = get_user_tokens(request.user_address)
+    current_tokens = await run_blocking(get_user_tokens, request.user_address)
     if current_tokens < required_tokens:
         raise HTTPException(
             status_code=400,
@@ -310,48 +500,78 @@ async def mint_badge(request: MintRequest):
         )
     
     try:
-        if not deduct_tokens(request.user_address, required_tokens):
-            raise HTTPException(status_code=400, detail="Token deduction failed")
-
-        nonce = get_nonce(accountAddress)
-        txn = contract.functions.mintBadge(
-            Web3.to_checksum_address(request.recipient),
-            request.badge_type,
-            request.token_uri
-        ).build_transaction({
-            "from": accountAddress,
-            "nonce": nonce,
-            "gas": 300000,
-            "gasPrice": web3.to_wei("2", "gwei")
-        })
+        Web3.to_checksum_address(request.recipient)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        signed_txn = web3.eth.account.sign_transaction(txn, private_key=privateKey)
-        tx_hash = web3.eth.send_raw_transaction(signed_txn.raw_transaction)
+    if not await run_blocking(deduct_tokens, request.user_address, required_tokens,
+                              request_key=current_request_key.get()):
+        raise HTTPException(status_code=400, detail="Token deduction failed")
+
+    # The mint worker sends the transaction and refunds the tokens if it fails or reverts
+    job = await run_blocking(
+        mint_queue.submit,
+        request.recipient,
+        request.badge_type,
+        request.token_uri,
+        request.user_address,
+        required_tokens,
+        request_key=current_request_key.get()
+    )
 
-        return {
-            "tx_hash": web3.to_hex(tx_hash),
-            "tokens_deducted": required_tokens,
-            "remaining_tokens": get_user_tokens(request.user_address),
-            "message": f"{request.badge_type} NFT minted successfully!"
-        }
-    except Exception as e:
-        add_tokens(request.user_address, required_tokens)
-        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/mint_status/{job.job_id}",
+        "tokens_deducted": required_tokens,
+        "remaining_tokens": await run_blocking(get_user_tokens, request.user_address),
+        "message": f"{request.badge_type} NFT mint queued"
+    }
+
+@app.get("/mint_status/{job_id}")
+async def mint_status(job_id: str):
+    job = await run_blocking(mint_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown mint job")
+    return job
 
 @app.post("/uploadMetadata")
 async def upload_metadata(data: MetadataRequest):
+    record_id = None
     try:
-        base_dir = Path(__file__).parent
-        generated_dir = base_dir / "generated"
-        generated_dir.mkdir(exist_ok=True)
-        
-        output_file = generated_dir / f"certificate_{sanitize_filename(data.student_name)}_{sanitize_filename(data.badge_type)}.png"
-        
-        # First upload metadata with placeholder
+        # A per-mint suffix keeps students who share a name from overwriting each other
+        file_name = f"certificate_{sanitize_filename(data.student_name)}_{sanitize_filename(data.badge_type)}_{uuid.uuid4().hex[:8]}.png"
+
+        # Reserve the record first so the QR code can carry a stable resolver link,
+        # which means the metadata only has to be pinned once, after the image
+        record = {
+            "student_name": data.student_name,
+            "class_semester": data.class_semester,
+            "university": data.university,
+            "badge_type": data.badge_type,
+            "metadata_uri": "",
+            "certificate_url": "",
+            "user_address": data.user_address,
+            "status": "pending"
+        }
+        record_id = await run_blocking(badge_records.append, record)
+        certificate_link = f"{CERTIFICATE_RESOLVER_URL}/{record_id}"
+
+        # Generate certificate with QR code
+        png_bytes = await generate_certificate(
+            data.student_name,
+            data.class_semester,
+            data.university,
+            certificate_link,
+            data.badge_type
+        )
+        await run_blocking(archive_certificate, png_bytes, file_name)
+
+        # "image" is filled in once the PNG is pinned
         metadata = {
             "name": f"{data.student_name} - {data.badge_type}",
             "description": f"Certificate for {data.student_name}",
-            "image": "ipfs://placeholder",
+            "external_url": certificate_link,
             "attributes": [
                 {"trait_type": "Student", "value": data.student_name},
                 {"trait_type": "Class", "value": data.class_semester},
@@ -360,57 +580,48 @@ async def upload_metadata(data: MetadataRequest):
                 {"trait_type": "Date", "value": datetime.now().strftime("%Y-%m-%d")}
             ]
         }
-        
-        metadata_cid = await upload_metadata_to_pinata(metadata)
-        metadata_url = f"https://gateway.pinata.cloud/ipfs/{metadata_cid}"
-        
-        # Generate certificate with QR code
-        generate_certificate(
-            str(output_file),
-            data.student_name,
-            data.class_semester,
-            data.university,
-            metadata_url,
-            data.badge_type
-        )
-        
-        # Upload certificate image
-        image_cid = await upload_file_to_pinata(str(output_file))
-        image_url = f"https://gateway.pinata.cloud/ipfs/{image_cid}"
-        
-        # Update metadata with actual image URL
-        metadata["image"] = f"ipfs://{image_cid}"
-        metadata_cid = await upload_metadata_to_pinata(metadata)
-        metadata_url = f"https://gateway.pinata.cloud/ipfs/{metadata_cid}"
-        
-        # Save record
-        record = {
-            "student_name": data.student_name,
-            "class_semester": data.class_semester,
-            "university": data.university,
-            "badge_type": data.badge_type,
-            "metadata_uri": metadata_url,
-            "certificate_url": image_url,
-            "user_address": data.user_address
-        }
-        
-        if Path(STUDENT_BADGE_DATA).exists():
-            with open(STUDENT_BADGE_DATA, "r") as f:
-                badge_data = json.load(f)
-        else:
-            badge_data = []
-        
-        badge_data.append(record)
-        with open(STUDENT_BADGE_DATA, "w") as f:
-            json.dump(badge_data, f, indent=2)
-        
-        return {
-            "metadata_uri": metadata_url,
-            "certificate_url": image_url
-        }
+        task_id = await run_blocking(upload_outbox.enqueue, png_bytes, file_name, metadata, record_id=record_id)
+    except CertificateQueueFull as e:
+        await run_blocking(badge_records.delete, record_id)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
+        if record_id is not None:
+            await run_blocking(badge_records.delete, record_id)
         raise HTTPException(status_code=400, detail=str(e))
 
+    # From here a Pinata failure is retried by the outbox drainer instead of failing the request
+    task = await upload_outbox.process_async(task_id)
+    if task["status"] == COMPLETE:
+        status = upload_task_status(task)
+        return {
+            "metadata_uri": status["metadata_uri"],
+            "certificate_url": status["certificate_url"],
+            "certificate_link": status["certificate_link"]
+        }
+    if task["status"] == PENDING:
+        return JSONResponse(
+            status_code=202,
+            content=dict(upload_task_status(task), status_url=f"/upload_status/{task_id}")
+        )
+    raise HTTPException(status_code=502, detail=task["last_error"])
+
+@app.get("/upload_status/{task_id}")
+async def upload_status(task_id: str):
+    task = await run_blocking(upload_outbox.get, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Unknown upload task")
+    return upload_task_status(task)
+
+@app.get("/certificate/{record_id}")
+async def resolve_certificate(record_id: int):
+    """Stable target for certificate QR codes: redirect to the record's pinned metadata"""
+    record = await run_blocking(badge_records.get, record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Certificate not found")
+    if not record.get("metadata_uri"):
+        raise HTTPException(status_code=409, detail="Certificate is still being issued")
+    return RedirectResponse(record["metadata_uri"])
+
 # Admin endpoints
 @app.post("/admin_add_tokens")
 async def admin_add_tokens(data: dict):
@@ -420,8 +631,8 @@ async def admin_add_tokens(data: dict):
     if not user_address or not token_amount:
         raise HTTPException(status_code=400, detail="User address and token amount are required")
     
-    initialize_user_tokens(user_address, 0)
-    new_balance = add_tokens(user_address, token_amount)
+    # add_tokens creates the account if it does not exist yet
+    new_balance = await run_blocking(add_tokens, user_address, token_amount, request_key=current_request_key.get())
     
     return {
         "user_address": user_address,
@@ -435,8 +646,8 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "blockchain_connected": web3.is_connected(),
-        "total_users": len(user_tokens)
+        "blockchain_connected": await run_blocking(web3.is_connected),
+        "total_users": await run_blocking(ledger.user_count)
     }
 
 from fastapi import Path
@@ -446,39 +657,32 @@ async def get_teams():
     """
     Return list of unique team names (example logic based on student badge data).
     """
-    if Path(STUDENT_BADGE_DATA).exists():
-        with open(STUDENT_BADGE_DATA, "r") as f:
-            badge_data = json.load(f)
-        # Example: using "class_semester" as team name
-        team_names = list({record.get("class_semester", "Unknown") for record in badge_data})
+    # Example: using "class_semester" as team name
+    team_names = team_index.teams()
+    if team_names:
         return team_names
-    else:
-        # Example static fallback
-        return ["Alpha Squad", "Beta Team", "Gamma Group"]
+    # Example static fallback
+    return ["Alpha Squad", "Beta Team", "Gamma Group"]
 
 @app.get("/team_details/{team_name}")
 async def get_team_details(team_name: str = Path(..., description="Name of the team")):
     """
     Return details (captain & members) for given team name.
     """
-    if Path(STUDENT_BADGE_DATA).exists():
-        with open(STUDENT_BADGE_DATA, "r") as f:
-            badge_data = json.load(f)
-        # Filter records for this team
-        team_records = [r for r in badge_data if r.get("class_semester") == team_name]
-        if not team_records:
+    if team_index.teams():
+        members = team_index.members(team_name)
+        if not members:
             raise HTTPException(status_code=404, detail="Team not found")
-        
+
         # Example logic: first student is captain, rest are members
-        captain = team_records[0].get("student_name", "Unknown")
-        members = [r.get("student_name", "Unknown") for r in team_records]
+        captain = members[0]
 
         return {
             "captain": captain,
             "members": members
         }
     else:
-        # Example static fallback
+        # Example static fallback, only while there are no badge records
         if team_name == "Alpha Squad":
             return {
                 "captain": "Alice",
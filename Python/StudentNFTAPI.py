@@ -1,16 +1,29 @@
-from flask import Flask, jsonify, request
-import requests
+from flask import Flask, Response, g, jsonify, redirect, request, stream_with_context
 from web3 import Web3
+import functools
 import json
 import os
 from dotenv import load_dotenv
 from datetime import datetime
-from requests_toolbelt.multipart.encoder import MultipartEncoder
 from pathlib import Path
 from collections import OrderedDict
 import pyshorteners
-import random
 import re
+import threading
+import uuid
+from nonce_manager import NonceManager
+from mint_queue import MintQueue
+from batch_mint import BatchMinter
+from badge_indexer import BadgeIndexer
+from metadata_cache import MetadataCache
+from contract_reads import BatchReader
+from token_ledger import TokenLedger
+from badge_records import BadgeRecordStore
+from quiz_sessions import QuizSession, create_session_store
+from quiz_bank import QuizBank
+from certificate_service import CertificateService, CertificateQueueFull
+from upload_outbox import UploadOutbox, COMPLETE, PENDING
+from pinata_client import PinataClient, DEFAULT_UPLOAD_URL, DEFAULT_API_URL
 load_dotenv()
 
 # Environment variables
@@ -25,25 +38,64 @@ pinataJWT = os.getenv("PINATA_JWT")
 pinataBaseURL = os.getenv("PINATA_BASE_URL")
 pinataLegacyURL = os.getenv("PINATA_LEGACY_URL")
 STUDENT_BADGE_DATA = "./StudentBadges/StudentBadgeData.json"
+BADGE_RECORDS_DB = "./StudentBadges/badge_records.db"
+BADGE_INDEX_DB = "./StudentBadges/badge_index.db"
+BADGE_INDEX_START_BLOCK = int(os.getenv("BADGE_INDEX_START_BLOCK", "0"))
+METADATA_CACHE_DIR = "./metadata_cache"
+TOKEN_LEDGER_DB = "./StudentBadges/token_ledger.db"
+METADATA_FETCH_DEADLINE = 30  # seconds before list_minted_badges gives up on slow gateway fetches
 CERTIFICATE_DIR = ""
 
 # Quiz configuration
 TOKENS_PER_CORRECT_ANSWER = 50
 MINIMUM_TOKENS_FOR_NFT = 10
 QUIZ_QUESTIONS_FILE = "quiz_questions.json"
+QUIZ_QUESTIONS_PER_SESSION = 5
+QUIZ_TOPIC_WEIGHTS = None  # e.g. {"Intellectual Property": 3, "Blockchain": 1} to favour topics
+QUIZ_STRATIFIED_SAMPLING = False  # True to draw from each topic in proportion to its size
+QUIZ_SESSION_BACKEND = os.getenv("QUIZ_SESSION_BACKEND", "memory")  # "sqlite" to share sessions between workers
+QUIZ_SESSION_DB = "./StudentBadges/quiz_sessions.db"
+QUIZ_SESSION_TTL = 3600  # seconds of inactivity before a quiz session expires
+QUIZ_MAX_SESSIONS = 50000
+CERTIFICATE_QUEUE_TIMEOUT = 30  # seconds to wait for a free certificate render slot
+# Certificates are uploaded from memory; set this to also keep a copy of each PNG on disk
+CERTIFICATE_ARCHIVE_DIR = os.getenv("CERTIFICATE_ARCHIVE_DIR")
+# Certificate QR codes point here (plus the record id); /certificate/<id> redirects to the pinned metadata.
+# The link is printed into every certificate and pinned for good, so it must be the API's public
+# address (e.g. https://badges.example.edu/certificate), never a loopback one.
+CERTIFICATE_RESOLVER_URL = os.getenv("CERTIFICATE_RESOLVER_URL", "").rstrip("/")
+if not CERTIFICATE_RESOLVER_URL:
+    raise RuntimeError("CERTIFICATE_RESOLVER_URL is not set: give the public URL of this API's /certificate route")
+UPLOAD_OUTBOX_DB = "./StudentBadges/upload_outbox.db"
+MINT_JOBS_DB = "./StudentBadges/mint_jobs.db"
+UPLOAD_OUTBOX_DIR = "./StudentBadges/outbox"
+PINATA_GATEWAY_URL = "https://gateway.pinata.cloud/ipfs"
+# Clients send a unique value in this header to make ledger-changing requests safe to retry
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+# Tokens needed for each badge tier, also the thresholds the ledger keeps eligibility counts for
+BADGE_TOKEN_REQUIREMENTS = {
+    "Newbie": 10,
+    "Amateur": 30,
+    "Intermediate": 50,
+    "Pro": 75,
+    "entrePROneur": 100
+}
 
 # Pinata Headers
 PINATA_JWT = os.getenv("PINATA_JWT")
 HEADERS = {
     "Authorization": f"Bearer {PINATA_JWT}"
 }
+PINATA_UPLOAD_URL = os.getenv("PINATA_UPLOAD_URL", DEFAULT_UPLOAD_URL)
+PINATA_API_URL = os.getenv("PINATA_API_URL", DEFAULT_API_URL)
+PINATA_REQUESTS_PER_MINUTE = int(os.getenv("PINATA_REQUESTS_PER_MINUTE", "60"))  # match the Pinata plan
 
 # Initialize Flask app
 app = Flask(__name__)
 
 # Connect to blockchain
 web3 = Web3(Web3.HTTPProvider(localRPC))
-assert web3.is_connected()
 
 # Load contract ABI
 with open(contractJSON) as f:
@@ -52,283 +104,224 @@ with open(contractJSON) as f:
 checksum_address = Web3.to_checksum_address(contractAddress)
 contract = web3.eth.contract(address=checksum_address, abi=abi)
 
-# Quiz questions (hardcoded for now, can be loaded from JSON file)
-QUIZ_QUESTIONS = [
-    {
-        "id": 1,
-        "question": "What is intellectual property (IP)?",
-        "options": [
-            "A physical asset owned by a company",
-            "A set of legal rights over creations of the mind",
-            "A form of tangible property like land or machinery",
-            "A type of government regulation on businesses"
-        ],
-        "correct_answer": 1
-    },
-    {
-        "id": 2,
-        "question": "Which of the following is NOT a type of intellectual property?",
-        "options": [
-            "Patents",
-            "Copyrights",
-            "Trademarks",
-            "Having a thought for an idea for a smartphone"
-        ],
-        "correct_answer": 3
-    },
-    {
-        "id": 3,
-        "question": "What type of intellectual property protects an invention?",
-        "options": [
-            "Copyright",
-            "Trademark",
-            "Patent",
-            "Trade secret"
-        ],
-        "correct_answer": 2
-    },
-    {
-        "id": 4,
-        "question": "A trademark primarily protects:",
-        "options": [
-            "Literary and artistic works",
-            "A company's brand name, logo, or slogan",
-            "The design of a product",
-            "A new technological invention"
-        ],
-        "correct_answer": 1
-    },
-    {
-        "id": 5,
-        "question": "How long does a copyright generally last in most countries?",
-        "options": [
-            "10 years",
-            "The lifetime of the author plus 60-70 years",
-            "20 years from the filing date",
-            "Indefinitely as long as it is in use"
-        ],
-        "correct_answer": 1
-    }
-]
+# Contract view calls go to the node as JSON-RPC batches
+batch_reader = BatchReader(contract, localRPC)
 
-# In-memory storage for user sessions and tokens
-user_sessions = {}
-user_tokens = {}
+# Badge records are appended to an indexed store; the legacy JSON file is imported at startup
+badge_records = BadgeRecordStore(BADGE_RECORDS_DB)
 
-# Utility functions
-def get_nonce(address):
-    return web3.eth.get_transaction_count(address)
+# Local index of BadgeMinted events backing /list_minted_badges
+badge_indexer = BadgeIndexer(contract, BADGE_INDEX_DB, start_block=BADGE_INDEX_START_BLOCK)
+
+# IPFS metadata is immutable per CID, so gateway fetches are cached in memory and on disk
+metadata_cache = MetadataCache(METADATA_CACHE_DIR)
+
+# Nonces for the minting signer are allocated locally so writes can be pipelined
+nonce_manager = NonceManager(web3, accountAddress, privateKey)
+
+# Questions come from QUIZ_QUESTIONS_FILE and are reloaded when the file changes
+quiz_bank = QuizBank(QUIZ_QUESTIONS_FILE)
 
+# Quiz sessions expire after QUIZ_SESSION_TTL and hold question ids only; token balances live in the SQLite ledger
+quiz_sessions = create_session_store(
+    QUIZ_SESSION_BACKEND,
+    db_path=QUIZ_SESSION_DB,
+    ttl=QUIZ_SESSION_TTL,
+    max_sessions=QUIZ_MAX_SESSIONS
+)
+ledger = TokenLedger(TOKEN_LEDGER_DB, tiers=BADGE_TOKEN_REQUIREMENTS.values())
+
+# Utility functions
 def initialize_user_tokens(user_address, initial_tokens=10000):
     """Initialize user with tokens if not already present"""
-    if user_address not in user_tokens:
-        user_tokens[user_address] = initial_tokens
-    return user_tokens[user_address]
+    return ledger.initialize(user_address, initial_tokens)
 
 def get_user_tokens(user_address):
     """Get current token balance for user"""
-    return user_tokens.get(user_address, 0)
+    return ledger.get(user_address)
 
-def add_tokens(user_address, amount):
+def add_tokens(user_address, amount, request_key=None):
     """Add tokens to user balance"""
-    if user_address not in user_tokens:
-        user_tokens[user_address] = 0
-    user_tokens[user_address] += amount
-    return user_tokens[user_address]
+    return ledger.credit(user_address, amount, request_key=request_key)
 
-def deduct_tokens(user_address, amount):
+def deduct_tokens(user_address, amount, request_key=None):
     """Deduct tokens from user balance"""
-    if user_address not in user_tokens:
-        return False
-    if user_tokens[user_address] < amount:
-        return False
-    user_tokens[user_address] -= amount
-    return True
-
-
-def uploadFileToPinata(filePath):
-    print(f"Checking file path: {filePath}")
-    filePath = filePath.strip()
-
-    if not os.path.isfile(filePath):
-        raise FileNotFoundError(f"File not found: {filePath}")
+    return ledger.debit(user_address, amount, request_key=request_key)
 
-    fileName = os.path.basename(filePath)
-    print(f"The fileName is: {fileName}")
+def refund_tokens(user_address, amount, request_key=None):
+    """Undo a deduction that did not go through; pass the deduction's request_key so a retry pays again"""
+    return ledger.refund(user_address, amount, request_key=request_key)
 
-    with open(filePath, "rb") as fileObj:
-        m = MultipartEncoder(
-            fields={
-                "file": (fileName, fileObj, "application/octet-stream")
-            }
-        )
-
-        headers = {
-            "Authorization": f"Bearer {PINATA_JWT}",
-            "Content-Type": m.content_type
-        }
-
-        response = requests.post(
-            "https://uploads.pinata.cloud/v3/files",
-            headers=headers,
-            data=m,
-            timeout=30
-        )
-
-        if response.status_code != 200:
-            print("❌ Metadata upload failed:")
-            print("Status Code:", response.status_code)
-            print("Response:", response.text)
-            raise requests.HTTPError(f"Upload failed: {response.status_code} - {response.text}")
-
-        responseJSON = response.json()
-
-        if "data" not in responseJSON or "cid" not in responseJSON["data"]:
-            raise ValueError("Unexpected response format: 'cid' missing")
+def idempotent(view):
+    """
+    Make a ledger-changing endpoint safe to retry. A request carrying an
+    Idempotency-Key header runs once; repeats get the stored response back, or
+    409 while the first one is still running. The view passes request_key() to
+    its ledger mutation so a retry that takes over a stalled request does not
+    move the balance twice. 5xx responses are not stored and may be retried.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({"error": f"{IDEMPOTENCY_HEADER} must be at most 255 characters"}), 400
+
+        g.request_key = f"{request.endpoint}:{key}"
+        owner, stored = ledger.claim_request(g.request_key)
+        if not owner:
+            if stored is None:
+                return jsonify({"error": "A request with this Idempotency-Key is still being processed"}), 409
+            response = jsonify(stored["body"])
+            response.status_code = stored["status"]
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
 
-        return responseJSON["data"]
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except BaseException:
+            ledger.release_request(g.request_key)
+            raise
+        if response.status_code < 500 and response.is_json:
+            ledger.finish_request(g.request_key, {"status": response.status_code, "body": response.get_json()})
+        else:
+            ledger.release_request(g.request_key)
+        return response
+    return wrapper
+
+def request_key():
+    """The current request's idempotency key for ledger mutations, None without the header"""
+    return g.get("request_key")
+
+# Background mint worker, refunds go back through refund_tokens. Mints arriving within
+# batch_window seconds share one mintBadgeBatch transaction when the contract has it.
+# Jobs are kept in MINT_JOBS_DB, so queued mints survive a restart and any worker can report on them.
+mint_queue = MintQueue(
+    web3, contract, nonce_manager, MINT_JOBS_DB,
+    refund=refund_tokens,
+    batch_size=25,
+    batch_window=0.25
+)
+
+# Pipelined roster minting for admin_batch_fund_and_mint
+batch_minter = BatchMinter(web3, contract, nonce_manager)
+
+
+# Shared keep-alive Pinata session with timeouts, retries on 429/5xx and a client-side rate limit
+pinata = PinataClient(
+    PINATA_JWT,
+    upload_url=PINATA_UPLOAD_URL,
+    api_url=PINATA_API_URL,
+    json_url=pinataLegacyURL,
+    requests_per_minute=PINATA_REQUESTS_PER_MINUTE
+)
 
 
 def uploadMetadataToPinata(metadata):
-    url = pinataLegacyURL
-    headers = {
-        "Authorization": f"Bearer {pinataJWT}",
-        "Content-Type": "application/json"
-    }
-    response = requests.request("POST", url, json=metadata, headers=headers)
-    if response.status_code != 200:
-        raise requests.HTTPError(f"Pinning Metadata to Pinata Failed: {response.status_code} - {response.text}")
+    return pinata.pin_json(metadata)
 
-    responseJSON = response.json()
-    if "IpfsHash" not in responseJSON:
-        raise ValueError("IPFSHash is not found in the Response")
-    return responseJSON["IpfsHash"]
+# Certificates render on worker processes, each holding a preloaded CertificateRenderer
+certificate_service = CertificateService()
 
-def generate_certificate(output_file, name, team_name, branch, link, badge_name):
+def generate_certificate(name, team_name, branch, link, badge_name):
     """
-    Generate a certificate with the provided details.
+    Generate a certificate with the provided details and return it as PNG bytes.
     """
-    from PIL import Image, ImageDraw, ImageFont
-    from datetime import datetime
-    import qrcode
-    import os
-    baseDir = os.path.dirname(os.path.abspath(__file__))
-    font_file = os.path.join(baseDir, "fonts", "dejavu-sans-webfont.ttf")
-    name_font = ImageFont.truetype(font_file, 45)
-
-    # Use a Linux system font
-    #font_file = "/usr/share/fonts/dejavu-sans-fonts/DejaVuSans-Bold.ttf"
-    #try:
-    #    font_file = "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"
-    #    name_font = ImageFont.truetype("DejaVuSans-Bold.ttf", 45)
-    #except OSError:
-    #    raise FileNotFoundError(f"Font not found at: {font_file}. Install with: sudo dnf install dejavu-sans-fonts")
-#
-#    if not os.path.exists(font_file):
-#        raise FileNotFoundError("Font file not found at expected Linux path")
-#
-#    # Use the Linux-friendly path for the certificate template
-    input_file = os.path.join(baseDir, "certificate_of_achievement.png")
-    if not os.path.exists(input_file):
-        raise FileNotFoundError("Certificate template image not found!")
-
-    # Open base certificate
-    image = Image.open(input_file)
-    draw = ImageDraw.Draw(image)
-
-    # Text color
-    text_color = (255, 255, 255)
-
-    # Get current date
-    current_date = datetime.now().strftime("%B %d, %Y")
-
-    # Adjust font sizes to fit
-    name_font = ImageFont.truetype(font_file, 45)
-    team_name_font = ImageFont.truetype(font_file, 20)
-    branch_font = ImageFont.truetype(font_file, 20)
-    date_font = ImageFont.truetype(font_file, 35)
-    badge_font = ImageFont.truetype(font_file, 30)
-
-
-    # Text positions
-    name_position =((image.width - draw.textbbox((0, 0), name, font=name_font)[2]) // 2, 680)
-    team_name_position =(728, 780)
-    branch_position =(680, 812)
-    date_position = (467, 985)
-    badge_name_position = (745, 528)
-
-    # Now draw the text
-    draw.text(name_position, name.title(), font=name_font, fill=text_color)
-    draw.text(team_name_position, team_name.title(), font=team_name_font, fill=text_color)
-    draw.text(branch_position, branch.upper(), font=branch_font, fill=text_color)
-    draw.text(date_position, current_date, font=date_font, fill=text_color)
-    draw.text(badge_name_position, badge_name, font=badge_font, fill=text_color)
-
-    # Generate QR code with a custom color
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(link)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color='white', back_color=(54, 151, 193))
-
-    # Resize QR code if needed
-    qr_img = qr_img.resize((250, 250))
-
-    # Define QR code position
-    qr_position = (1145, 580)
-
-    # Paste QR code into certificate
-    image.paste(qr_img, qr_position)
-
-    # Save the updated image
-    image.save(output_file)
+    return certificate_service.encode(name, team_name, branch, link, badge_name,
+                                      timeout=CERTIFICATE_QUEUE_TIMEOUT)
+
+def archive_certificate(png_bytes, file_name):
+    """Keep a copy of an uploaded certificate when CERTIFICATE_ARCHIVE_DIR is set"""
+    if not CERTIFICATE_ARCHIVE_DIR:
+        return None
+    os.makedirs(CERTIFICATE_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(CERTIFICATE_ARCHIVE_DIR, file_name)
+    with open(path, "wb") as f:
+        f.write(png_bytes)
+    return path
+
 def sanitize_filename(text):
     # Replace any character that is not alphanumeric or underscore with underscore
     return re.sub(r'[^\w\-]', '_', text)
 
-def test_upload_to_pinata(file_path):
-    if not os.path.isfile(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-
-    print("Uploading:", file_path)
-    file_size = os.path.getsize(file_path)
-    print("File size:", file_size)
+def upload_png_to_pinata(png_bytes, file_name):
+    """Upload an in-memory PNG; the multipart body streams straight from the buffer"""
+    if not png_bytes:
+        raise ValueError("Certificate image is empty!")
 
-    if file_size == 0:
-        raise ValueError("File is empty!")
-
-    with open(file_path, "rb") as file_obj:
-        m = MultipartEncoder(
-            fields={
-                "file": (os.path.basename(file_path), file_obj, "application/octet-stream"),
-                "network": "public"
-            }
-        )
-
-        headers = {
-            "Authorization": f"Bearer {PINATA_JWT}",  # Make sure this is set
-            "Content-Type": m.content_type
-        }
-
-        response = requests.post(
-            "https://uploads.pinata.cloud/v3/files",
-            headers=headers,
-            data=m
-        )
-
-        print("Response:", response.status_code)
-        print("Body:", response.text)
-
-        if response.status_code != 200:
-            raise requests.HTTPError(f"Upload failed: {response.status_code} - {response.text}")
-
-        res_json = response.json()
-        if "data" not in res_json or "cid" not in res_json["data"]:
-            raise ValueError("Unexpected response format: 'cid' missing")
+    print("Uploading:", file_name, "size:", len(png_bytes))
+    data = pinata.upload_file(png_bytes, file_name, content_type="image/png")
+    return {
+        "cid": data["cid"],
+        "url": f"https://gateway.pinata.cloud/ipfs/{data['cid']}"
+    }
+def build_certificate_metadata(template, image_cid):
+    """Fill the pinned image into a certificate's metadata template"""
+    metadata = json.loads(json.dumps(template))
+    metadata["pinataContent"]["image_cid"] = image_cid
+    metadata["pinataContent"]["certificate_url"] = f"{PINATA_GATEWAY_URL}/{image_cid}"
+    return metadata
+
+def complete_certificate_upload(task):
+    badge_records.update(
+        task["record_id"],
+        metadata_uri=f"{PINATA_GATEWAY_URL}/{task['metadata_cid']}",
+        certificate_url=f"{PINATA_GATEWAY_URL}/{task['image_cid']}",
+        status="complete"
+    )
+
+def fail_certificate_upload(task):
+    """Out of retries: drop the reserved record and give the student their tokens back"""
+    badge_records.delete(task["record_id"])
+    context = task["context"]
+    refund_tokens(context["user_address"], context["tokens"], request_key=context.get("request_key"))
+
+def upload_task_status(task):
+    status = {
+        "task_id": task["task_id"],
+        "status": task["status"],
+        "attempts": task["attempts"],
+        "last_error": task["last_error"],
+        "certificate_link": f"{CERTIFICATE_RESOLVER_URL}/{task['record_id']}"
+    }
+    if task["status"] == COMPLETE:
+        status["metadata_uri"] = f"{PINATA_GATEWAY_URL}/{task['metadata_cid']}"
+        status["certificate_url"] = f"{PINATA_GATEWAY_URL}/{task['image_cid']}"
+    return status
+
+# Certificate uploads go through a durable outbox: a Pinata failure leaves the rendered PNG
+# and any finished pins on disk for the background drainer to resume
+upload_outbox = UploadOutbox(
+    UPLOAD_OUTBOX_DB,
+    UPLOAD_OUTBOX_DIR,
+    pin_image=lambda png_bytes, file_name: upload_png_to_pinata(png_bytes, file_name)["cid"],
+    pin_metadata=uploadMetadataToPinata,
+    build_metadata=build_certificate_metadata,
+    on_complete=complete_certificate_upload,
+    on_failed=fail_certificate_upload
+)
+
+# Connecting, importing and starting the background workers happen once the app is
+# served, not on import: certificate worker processes re-import this module
+_startup_lock = threading.Lock()
+_started = False
+
+def start_background_work():
+    global _started
+    with _startup_lock:
+        if _started:
+            return
+        assert web3.is_connected()
+        badge_records.import_json(STUDENT_BADGE_DATA)
+        mint_queue.start()
+        upload_outbox.start()
+        _started = True
+
+@app.before_request
+def ensure_started():
+    start_background_work()
 
-        return {
-            "cid": res_json["data"]["cid"],
-            "url": f"https://gateway.pinata.cloud/ipfs/{res_json['data']['cid']}"
-        }
 # NEW QUIZ-RELATED ENDPOINTS
 
 @app.route("/initialize_user", methods=["POST"])
@@ -369,104 +362,189 @@ def start_quiz():
     initialize_user_tokens(user_address)
 
     # Create quiz session
-    session_id = f"{user_address}_{datetime.now().timestamp()}"
-    user_sessions[session_id] = {
-        "user_address": user_address,
-        "questions": random.sample(QUIZ_QUESTIONS, min(5, len(QUIZ_QUESTIONS))),
-        "current_question": 0,
-        "correct_answers": 0,
-        "total_questions": min(5, len(QUIZ_QUESTIONS)),
-        "started_at": datetime.now().isoformat()
-    }
+    question_ids = quiz_bank.sample(
+        QUIZ_QUESTIONS_PER_SESSION,
+        topic_weights=QUIZ_TOPIC_WEIGHTS,
+        stratified=QUIZ_STRATIFIED_SAMPLING
+    )
+    session = QuizSession.new(user_address, question_ids)
+    quiz_sessions.save(session)
 
-    return jsonify({
-        "session_id": session_id,
-        "total_questions": user_sessions[session_id]["total_questions"],
+    response = {
+        "session_id": session.session_id,
+        "total_questions": session.total_questions,
         "message": "Quiz session started successfully"
-    })
+    }
+    # Batch mode: hand out every question now and take the answers through /submit_answers
+    if data.get("include_questions"):
+        response["questions"] = quiz_questions_for(session)
+    return jsonify(response)
+
+def quiz_questions_for(session):
+    """A session's questions without their answers, in the order /submit_answers expects"""
+    questions = []
+    for number, question_id in enumerate(session.question_ids, start=1):
+        question = quiz_bank.get(question_id)
+        if question is not None:
+            questions.append({
+                "question_id": question_id,
+                "question_number": number,
+                "question": question["question"],
+                "options": question["options"]
+            })
+    return questions
 
 @app.route("/get_question/<session_id>", methods=["GET"])
 def get_question(session_id):
     """Get current question for a quiz session"""
-    if session_id not in user_sessions:
+    session = quiz_sessions.get(session_id)
+    if session is None:
         return jsonify({"error": "Invalid session ID"}), 400
 
-    session = user_sessions[session_id]
-
-    if session["current_question"] >= len(session["questions"]):
+    if session.completed:
         return jsonify({"error": "Quiz completed"}), 400
 
-    current_q = session["questions"][session["current_question"]]
+    current_q = quiz_bank.get(session.current_question_id)
+    if current_q is None:
+        return jsonify({"error": "This question was removed from the quiz bank, please start a new quiz"}), 409
 
     return jsonify({
-        "question_number": session["current_question"] + 1,
-        "total_questions": session["total_questions"],
+        "question_number": session.current_question + 1,
+        "total_questions": session.total_questions,
         "question": current_q["question"],
         "options": current_q["options"]
     })
 
 @app.route("/submit_answer", methods=["POST"])
+@idempotent
 def submit_answer():
     """Submit answer for current question"""
     data = request.get_json()
     session_id = data.get("session_id")
     answer = data.get("answer")  # 0-based index
 
-    if session_id not in user_sessions:
+    session = quiz_sessions.get(session_id)
+    if session is None:
         return jsonify({"error": "Invalid session ID"}), 400
 
     if answer is None:
         return jsonify({"error": "Answer is required"}), 400
 
-    session = user_sessions[session_id]
-    current_q = session["questions"][session["current_question"]]
+    if session.completed:
+        return jsonify({"error": "Quiz completed"}), 400
+
+    current_q = quiz_bank.get(session.current_question_id)
+    if current_q is None:
+        return jsonify({"error": "This question was removed from the quiz bank, please start a new quiz"}), 409
 
     is_correct = answer == current_q["correct_answer"]
     tokens_earned = 0
 
+    # Move the session on before paying, and only if no concurrent request already did
+    answered = session.current_question
+    session.current_question += 1
     if is_correct:
-        session["correct_answers"] += 1
-        tokens_earned = TOKENS_PER_CORRECT_ANSWER
-        add_tokens(session["user_address"], tokens_earned)
+        session.correct_answers += 1
+    if not quiz_sessions.save_if(session, answered):
+        return jsonify({"error": "This question was already answered"}), 409
 
-    session["current_question"] += 1
+    if is_correct:
+        tokens_earned = TOKENS_PER_CORRECT_ANSWER
+        add_tokens(session.user_address, tokens_earned, request_key=request_key())
 
     # Check if quiz is completed
-    quiz_completed = session["current_question"] >= len(session["questions"])
+    quiz_completed = session.completed
 
     response = {
         "correct": is_correct,
         "correct_answer": current_q["correct_answer"],
         "tokens_earned": tokens_earned,
-        "total_tokens": get_user_tokens(session["user_address"]),
+        "total_tokens": get_user_tokens(session.user_address),
         "quiz_completed": quiz_completed
     }
 
     if quiz_completed:
         response.update({
-            "final_score": f"{session['correct_answers']}/{session['total_questions']}",
-            "total_tokens_earned": session["correct_answers"] * TOKENS_PER_CORRECT_ANSWER,
-            "can_mint_nft": get_user_tokens(session["user_address"]) >= MINIMUM_TOKENS_FOR_NFT
+            "final_score": f"{session.correct_answers}/{session.total_questions}",
+            "total_tokens_earned": session.correct_answers * TOKENS_PER_CORRECT_ANSWER,
+            "can_mint_nft": get_user_tokens(session.user_address) >= MINIMUM_TOKENS_FOR_NFT
         })
 
     return jsonify(response)
 
+@app.route("/submit_answers", methods=["POST"])
+@idempotent
+def submit_answers():
+    """Score all remaining answers of a session at once and credit the tokens in one ledger write"""
+    data = request.get_json()
+    session_id = data.get("session_id")
+    answers = data.get("answers")  # 0-based option index per question, in question order
+
+    session = quiz_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Invalid session ID"}), 400
+
+    if not isinstance(answers, list) or len(answers) != session.total_questions:
+        return jsonify({"error": f"Expected a list of {session.total_questions} answers"}), 400
+
+    if session.completed:
+        return jsonify({"error": "Quiz completed"}), 400
+
+    # Questions already answered through /submit_answer keep their result
+    results = []
+    correct = 0
+    for position in range(session.current_question, session.total_questions):
+        question_id = session.question_ids[position]
+        question = quiz_bank.get(question_id)
+        if question is None:
+            return jsonify({"error": "A question was removed from the quiz bank, please start a new quiz"}), 409
+        is_correct = answers[position] == question["correct_answer"]
+        correct += is_correct
+        results.append({
+            "question_id": question_id,
+            "correct": is_correct,
+            "correct_answer": question["correct_answer"]
+        })
+
+    # Only one request may complete the session and be paid for it
+    answered = session.current_question
+    session.correct_answers += correct
+    session.current_question = session.total_questions
+    if not quiz_sessions.save_if(session, answered):
+        return jsonify({"error": "This quiz was already submitted"}), 409
+
+    tokens_earned = correct * TOKENS_PER_CORRECT_ANSWER
+    if tokens_earned:
+        total_tokens = add_tokens(session.user_address, tokens_earned, request_key=request_key())
+    else:
+        total_tokens = get_user_tokens(session.user_address)
+
+    return jsonify({
+        "results": results,
+        "tokens_earned": tokens_earned,
+        "total_tokens": total_tokens,
+        "quiz_completed": True,
+        "final_score": f"{session.correct_answers}/{session.total_questions}",
+        "total_tokens_earned": session.correct_answers * TOKENS_PER_CORRECT_ANSWER,
+        "can_mint_nft": total_tokens >= MINIMUM_TOKENS_FOR_NFT
+    })
+
 @app.route("/quiz_summary/<session_id>", methods=["GET"])
 def quiz_summary(session_id):
     """Get quiz session summary"""
-    if session_id not in user_sessions:
+    session = quiz_sessions.get(session_id)
+    if session is None:
         return jsonify({"error": "Invalid session ID"}), 400
 
-    session = user_sessions[session_id]
-    user_address = session["user_address"]
+    user_address = session.user_address
     current_tokens = get_user_tokens(user_address)
 
     return jsonify({
         "session_id": session_id,
         "user_address": user_address,
-        "correct_answers": session["correct_answers"],
-        "total_questions": session["total_questions"],
-        "tokens_earned": session["correct_answers"] * TOKENS_PER_CORRECT_ANSWER,
+        "correct_answers": session.correct_answers,
+        "total_questions": session.total_questions,
+        "tokens_earned": session.correct_answers * TOKENS_PER_CORRECT_ANSWER,
         "current_total_tokens": current_tokens,
         "can_mint_nft": current_tokens >= MINIMUM_TOKENS_FOR_NFT,
         "tokens_needed_for_nft": max(0, MINIMUM_TOKENS_FOR_NFT - current_tokens)
@@ -488,6 +566,7 @@ def check_nft_eligibility(user_address):
     })
 
 @app.route("/mintBadge", methods=["POST"])
+@idempotent
 def mintBadge():
     """Mint badge if user has enough tokens based on badge type"""
     data = request.get_json()
@@ -498,6 +577,8 @@ def mintBadge():
 
     if not all([badge_type, token_uri, recipient, user_address]):
         return jsonify({"error": "Missing required fields"}), 400
+    if not all(isinstance(value, str) for value in (badge_type, token_uri, recipient, user_address)):
+        return jsonify({"error": "badge_type, token_uri, recipient and user_address must be strings"}), 400
 
     # Define cost per badge
     BADGE_COST = {
@@ -520,34 +601,38 @@ def mintBadge():
         }), 400
 
     try:
-        # Deduct the exact number of tokens for this badge type
-        if not deduct_tokens(user_address, required_tokens):
-            return jsonify({"error": "Token deduction failed"}), 400
-
-        nonce = get_nonce(accountAddress)
-        txn = contract.functions.mintBadge(Web3.to_checksum_address(recipient), badge_type, token_uri).build_transaction({
-            "from": accountAddress,
-            "nonce": nonce,
-            "gas": 300000,
-            "gasPrice": web3.to_wei("2", "gwei")
-        })
+        Web3.to_checksum_address(recipient)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        signed_txn = web3.eth.account.sign_transaction(txn, private_key=privateKey)
-        tx_hash = web3.eth.send_raw_transaction(signed_txn.raw_transaction)
+    # Deduct the exact number of tokens for this badge type
+    if not deduct_tokens(user_address, required_tokens, request_key=request_key()):
+        return jsonify({"error": "Token deduction failed"}), 400
 
-        return jsonify({
-            "tx_hash": web3.to_hex(tx_hash),
-            "tokens_deducted": required_tokens,
-            "remaining_tokens": get_user_tokens(user_address),
-            "message": f"{badge_type} NFT minted successfully!"
-        })
-    except Exception as e:
-        # Refund if something failed
-        add_tokens(user_address, required_tokens)
-        return jsonify({"error": str(e)}), 400
+    # The mint worker sends the transaction and refunds the tokens if it fails or reverts
+    job = mint_queue.submit(recipient, badge_type, token_uri, user_address, required_tokens,
+                            request_key=request_key())
+
+    return jsonify({
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/mint_status/{job.job_id}",
+        "tokens_deducted": required_tokens,
+        "remaining_tokens": get_user_tokens(user_address),
+        "message": f"{badge_type} NFT mint queued"
+    }), 202
+
+@app.route("/mint_status/<job_id>", methods=["GET"])
+def mint_status(job_id):
+    """Report the state of a queued mint"""
+    job = mint_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown mint job"}), 404
+    return jsonify(job)
 
 
 @app.route("/uploadMetadata", methods=["POST"])
+@idempotent
 def upload_metadata():
     """Generates certificate PNG with QR code and pins both PNG and metadata to Pinata in a simplified way."""
     data = request.json
@@ -568,51 +653,40 @@ def upload_metadata():
     if current_tokens < MINIMUM_TOKENS_FOR_NFT:
         return jsonify({"error": f"Insufficient tokens"}), 400
 
-    if not deduct_tokens(user_address, MINIMUM_TOKENS_FOR_NFT):
+    if not deduct_tokens(user_address, MINIMUM_TOKENS_FOR_NFT, request_key=request_key()):
         return jsonify({"error": "Failed to deduct tokens"}), 400
 
+    record_id = None
     try:
-        baseDir = os.path.dirname(os.path.abspath(__file__))
-        generated_dir = os.path.join(baseDir, "generated")
-        os.makedirs(generated_dir, exist_ok=True)
-        output_file = os.path.join(generated_dir, f"generated_{sanitize_filename(student_name)}_{sanitize_filename(badge_name)}.png")
+        # A per-mint suffix keeps students who share a name from overwriting each other
+        file_name = f"generated_{sanitize_filename(student_name)}_{sanitize_filename(badge_name)}_{uuid.uuid4().hex[:8]}.png"
 
-        # Prepare metadata first (with a dummy link)
-        metadata = {
-            "pinataMetadata": {"name": f"{student_name}-{badge_name}"},
-            "pinataContent": {
-                "image_cid": "",
-                "certificate_url": "",
-                "attributes": [
-                    {"Student": student_name},
-                    {"Class": team_name},
-                    {"University": university},
-                    {"Date": grant_date},
-                    {"Badge Type": badge_name},
-                    {"Tokens Used": MINIMUM_TOKENS_FOR_NFT}
-                ],
-            },
+        # Reserve the record first so the QR code can carry a stable resolver link,
+        # which means the metadata only has to be pinned once, after the image
+        record = {
+            "student_name": student_name,
+            "class_semester": team_name,
+            "university": university,
+            "badge_type": badge_name,
+            "grant_date": grant_date,
+            "metadata_uri": "",
+            "user_address": user_address,
+            "tokens_used": MINIMUM_TOKENS_FOR_NFT,
+            "status": "pending"
         }
+        record_id = badge_records.append(record)
+        certificate_link = f"{CERTIFICATE_RESOLVER_URL}/{record_id}"
 
-        # Pin metadata first to get its CID
-        metadata_cid = uploadMetadataToPinata(metadata)
-        metadataURL = f"https://gateway.pinata.cloud/ipfs/{metadata_cid}"
-
-        # Now generate certificate with QR code linking directly to metadata
-        generate_certificate(output_file, student_name, team_name, university, metadataURL, badge_name)
-        print(f"Checking file path: {output_file}")
-        # Pin certificate PNG
-        image_cid = test_upload_to_pinata(output_file)
-        image_url = f"https://gateway.pinata.cloud/ipfs/{image_cid['cid']}"
-        print("CID:", image_cid['cid'])
-        print("URL:", f"https://gateway.pinata.cloud/ipfs/{image_url}")
+        png_bytes = generate_certificate(student_name, team_name, university, certificate_link, badge_name)
+        archive_certificate(png_bytes, file_name)
 
-        # Update metadata with PNG link
+        # image_cid and certificate_url are filled in once the PNG is pinned
         metadata = {
             "pinataMetadata": {"name": f"{student_name}-{badge_name}"},
             "pinataContent": {
-                "image_cid": image_cid['cid'],
-                "certificate_url": image_url,
+                "image_cid": "",
+                "certificate_url": "",
+                "certificate_link": certificate_link,
                 "attributes": [
                     {"Student": student_name},
                     {"Class": team_name},
@@ -623,48 +697,60 @@ def upload_metadata():
                 ],
             },
         }
+        task_id = upload_outbox.enqueue(
+            png_bytes, file_name, metadata,
+            record_id=record_id,
+            context={"user_address": user_address, "tokens": MINIMUM_TOKENS_FOR_NFT, "request_key": request_key()}
+        )
 
-        metadata_cid = uploadMetadataToPinata(metadata)
-        metadataURL = f"https://gateway.pinata.cloud/ipfs/{metadata_cid}"
-
-        # Save to local JSON
-        record = {
-            "student_name": student_name,
-            "class_semester": team_name,
-            "university": university,
-            "badge_type": badge_name,
-            "grant_date": grant_date,
-            "metadata_uri": metadataURL,
-            "user_address": user_address,
-            "tokens_used": MINIMUM_TOKENS_FOR_NFT
-        }
-
-        if os.path.exists(STUDENT_BADGE_DATA):
-            with open(STUDENT_BADGE_DATA, "r") as f:
-                badge_data = json.load(f)
-        else:
-            badge_data = []
-
-        badge_data.append(record)
-
-        with open(STUDENT_BADGE_DATA, "w") as f:
-            json.dump(badge_data, f, indent=2)
-
-        return jsonify({"metadata_uri": metadataURL, "certificate_url": image_url})
-
+    except CertificateQueueFull as e:
+        badge_records.delete(record_id)
+        refund_tokens(user_address, MINIMUM_TOKENS_FOR_NFT, request_key=request_key())
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        add_tokens(user_address, MINIMUM_TOKENS_FOR_NFT)
+        if record_id is not None:
+            badge_records.delete(record_id)
+        refund_tokens(user_address, MINIMUM_TOKENS_FOR_NFT, request_key=request_key())
         return jsonify({"error": str(e)}), 400
 
+    # From here a Pinata failure is retried by the outbox drainer rather than refunded
+    task = upload_outbox.process(task_id)
+    if task["status"] == COMPLETE:
+        status = upload_task_status(task)
+        return jsonify({
+            "metadata_uri": status["metadata_uri"],
+            "certificate_url": status["certificate_url"],
+            "certificate_link": status["certificate_link"]
+        })
+    if task["status"] == PENDING:
+        return jsonify(dict(upload_task_status(task), status_url=f"/upload_status/{task_id}")), 202
+    return jsonify({"error": task["last_error"]}), 502
+
+@app.route("/upload_status/<task_id>", methods=["GET"])
+def upload_status(task_id):
+    task = upload_outbox.get(task_id)
+    if task is None:
+        return jsonify({"error": "Unknown upload task"}), 404
+    return jsonify(upload_task_status(task))
+
+@app.route("/certificate/<int:record_id>", methods=["GET"])
+def resolve_certificate(record_id):
+    """Stable target for certificate QR codes: redirect to the record's pinned metadata"""
+    record = badge_records.get(record_id)
+    if record is None:
+        return jsonify({"error": "Certificate not found"}), 404
+    if not record.get("metadata_uri"):
+        return jsonify({"error": "Certificate is still being issued"}), 409
+    return redirect(record["metadata_uri"])
+
 # EXISTING ENDPOINTS (unchanged)
 @app.route("/canmint/<badge_type>", methods=["GET"])
 def canMint(badge_type):
     try:
-        result = contract.functions.canMintBadge(badge_type).call()
-        minted = contract.functions.getMintedCount(badge_type).call()
-        cap = contract.functions.badgeTypes(badge_type).call()[1]
+        # badgeTypes holds (minted, cap) in one read; a cap of 0 means the type is uncapped
+        minted, cap = batch_reader.call("badgeTypes", badge_type)
         return jsonify({
-            "can_mint": result,
+            "can_mint": cap == 0 or minted < cap,
             "minted": minted,
             "cap": cap
         })
@@ -674,53 +760,71 @@ def canMint(badge_type):
 @app.route("/getMintedCount/<badge_type>", methods=["GET"])
 def mintedCount(badge_type):
     try:
-        count = contract.functions.getMintedCount(badge_type).call()
+        count = batch_reader.call("badgeTypes", badge_type)[0]
         return jsonify({"minted_count": count})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route("/getMintedCounts", methods=["GET"])
+def mintedCounts():
+    """Minted counts for every badge tier plus total supply, read in one batch"""
+    badge_names = ["Newbie", "Amateur", "Intermediate", "Pro", "entrePROneur"]
+    try:
+        results = batch_reader.call_many(
+            [("badgeTypes", (name,)) for name in badge_names] + [("totalSupply", ())]
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return jsonify({
+            "minted_counts": {name: info[0] for name, info in zip(badge_names, results)},
+            "total_supply": results[-1]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route("/list_minted_badges", methods=["GET"])
 def list_minted_badges():
-    metadata_uris = []
     try:
-        latest_id = contract.functions.totalSupply().call()
-        if latest_id <= 0:
-            return jsonify([]), 200
-        for token_id in range(1, latest_id + 1):
-            metadata_uri = contract.functions.tokenURI(token_id).call()
-            metadata_uris.append(metadata_uri)
+        # Only blocks produced since the last call are scanned for new BadgeMinted logs
+        badge_indexer.sync()
+        metadata_uris = [badge["metadata_uri"] for badge in badge_indexer.badges()]
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-    results = []
-    for metadata_uri in metadata_uris:
-        try:
-            response = requests.get(metadata_uri)
-            if response.status_code != 200:
+    def generate():
+        # Metadata is fetched concurrently but streamed back in token id order as a JSON array
+        yield "["
+        first = True
+        for metadata_uri, badge_data in metadata_cache.get_many(metadata_uris, deadline=METADATA_FETCH_DEADLINE):
+            if not isinstance(badge_data, dict):
                 continue
-            badge_data = response.json()
-            certificate_url = badge_data.get('certificate_url', 'N/A')
-            attributes = badge_data.get("attributes", [])
-            student_collection = {
-                list(attr.keys())[0]: list(attr.values())[0] for attr in attributes
-            }
-            badge_info = OrderedDict([
-                ("Student Name", student_collection.get("Student", "N/A")),
-                ("Badge Grant Date", student_collection.get("Date", "N/A")),
-                ("Badge Type", student_collection.get("Badge Type", "N/A")),
-                ("Class or Semester", student_collection.get("Class", "N/A")),
-                ("University", student_collection.get("University", "N/A")),
-                ("Certificate URL", certificate_url),
-                ("Tokens Used", student_collection.get("Tokens Used", "N/A"))
-            ])
-            results.append(badge_info)
-        except Exception as e:
-            continue
+            try:
+                certificate_url = badge_data.get('certificate_url', 'N/A')
+                attributes = badge_data.get("attributes", [])
+                student_collection = {
+                    list(attr.keys())[0]: list(attr.values())[0] for attr in attributes
+                }
+                badge_info = OrderedDict([
+                    ("Student Name", student_collection.get("Student", "N/A")),
+                    ("Badge Grant Date", student_collection.get("Date", "N/A")),
+                    ("Badge Type", student_collection.get("Badge Type", "N/A")),
+                    ("Class or Semester", student_collection.get("Class", "N/A")),
+                    ("University", student_collection.get("University", "N/A")),
+                    ("Certificate URL", certificate_url),
+                    ("Tokens Used", student_collection.get("Tokens Used", "N/A"))
+                ])
+            except Exception as e:
+                continue
+            yield ("" if first else ",") + json.dumps(badge_info)
+            first = False
+        yield "]"
 
-    return jsonify(results), 200
+    return Response(stream_with_context(generate()), mimetype="application/json")
 # Add these endpoints to your existing StudentNFTAPI.py file
 
 @app.route("/admin_add_tokens", methods=["POST"])
+@idempotent
 def admin_add_tokens():
     """Admin endpoint to add tokens to user balance"""
     data = request.get_json()
@@ -733,11 +837,8 @@ def admin_add_tokens():
     if token_amount <= 0:
         return jsonify({"error": "Token amount must be positive"}), 400
 
-    # Initialize user if not exists
-    initialize_user_tokens(user_address, 0)
-
-    # Add tokens
-    new_balance = add_tokens(user_address, token_amount)
+    # Add tokens, creating the account if it does not exist yet
+    new_balance = add_tokens(user_address, token_amount, request_key=request_key())
 
     return jsonify({
         "user_address": user_address,
@@ -747,6 +848,7 @@ def admin_add_tokens():
     })
 
 @app.route("/admin_deduct_tokens", methods=["POST"])
+@idempotent
 def admin_deduct_tokens():
     """Admin endpoint to deduct tokens from user balance"""
     data = request.get_json()
@@ -767,7 +869,7 @@ def admin_deduct_tokens():
         }), 400
 
     # Deduct tokens
-    success = deduct_tokens(user_address, token_amount)
+    success = deduct_tokens(user_address, token_amount, request_key=request_key())
     if success:
         new_balance = get_user_tokens(user_address)
         return jsonify({
@@ -780,6 +882,7 @@ def admin_deduct_tokens():
         return jsonify({"error": "Failed to deduct tokens"}), 400
 
 @app.route("/admin_set_tokens", methods=["POST"])
+@idempotent
 def admin_set_tokens():
     """Admin endpoint to set exact token balance for user"""
     data = request.get_json()
@@ -793,7 +896,7 @@ def admin_set_tokens():
         return jsonify({"error": "Token amount cannot be negative"}), 400
 
     # Set exact balance
-    user_tokens[user_address] = token_amount
+    ledger.set_balance(user_address, token_amount, request_key=request_key())
 
     return jsonify({
         "user_address": user_address,
@@ -805,7 +908,7 @@ def admin_set_tokens():
 def admin_get_all_users():
     """Admin endpoint to get all users and their balances"""
     users_data = []
-    for user_address, balance in user_tokens.items():
+    for user_address, balance in ledger.balances():
         users_data.append({
             "user_address": user_address,
             "token_balance": balance
@@ -864,30 +967,24 @@ def admin_badge_eligibility(user_address):
 @app.route("/admin_stats", methods=["GET"])
 def admin_stats():
     """Admin endpoint to get system statistics"""
-    total_users = len(user_tokens)
-    total_tokens_distributed = sum(user_tokens.values())
+    # Totals and tier counts are maintained by the ledger on every write
+    stats = ledger.stats()
+    total_users = stats["total_users"]
+    total_tokens_distributed = stats["total_tokens"]
     average_tokens = total_tokens_distributed / total_users if total_users > 0 else 0
 
     # Badge statistics
-    badge_requirements = {
-        "Newbie": 10,
-        "Amateur": 30,
-        "Intermediate": 50,
-        "Pro": 75,
-        "entrePROneur": 100
+    badge_eligible_counts = {
+        badge: stats["tier_counts"].get(requirement, 0)
+        for badge, requirement in BADGE_TOKEN_REQUIREMENTS.items()
     }
 
-    badge_eligible_counts = {}
-    for badge, requirement in badge_requirements.items():
-        count = sum(1 for balance in user_tokens.values() if balance >= requirement)
-        badge_eligible_counts[badge] = count
-
     return jsonify({
         "total_users": total_users,
         "total_tokens_distributed": total_tokens_distributed,
         "average_tokens_per_user": round(average_tokens, 2),
         "badge_eligible_counts": badge_eligible_counts,
-        "active_sessions": len(user_sessions)
+        "active_sessions": quiz_sessions.count()
     })
 
 @app.route("/health", methods=["GET"])
@@ -897,78 +994,56 @@ def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "blockchain_connected": web3.is_connected(),
-        "total_users": len(user_tokens)
+        "total_users": ledger.user_count()
     })
 
-if __name__ == "__main__":
-    app.run(debug=True)
-
-
 @app.route("/admin_batch_fund_and_mint", methods=["POST"])
 def admin_batch_fund_and_mint():
     """
     Admin endpoint to read a JSON file of user name -> address,
     mint a Participation NFT to each, and optionally fund with ETH.
+    Results stream back as NDJSON, one line per address, followed by a summary line.
     """
     json_file = request.json.get("json_file", r"D:\comp codes\internship_projects\cie\StudentNFT_ver3\IgniteApp\project2\server\data\teamWallets.json")
     badge_type = request.json.get("badge_type", "Participation")
     faucet_enabled = request.json.get("faucet_enabled", False)
     fund_amount_eth = request.json.get("fund_amount_eth", 20)
 
+    if not isinstance(badge_type, str) or not badge_type:
+        return jsonify({"error": "badge_type must be a non-empty string"}), 400
+    if isinstance(fund_amount_eth, bool) or not isinstance(fund_amount_eth, (int, float)) or fund_amount_eth < 0:
+        return jsonify({"error": "fund_amount_eth must be a non-negative number"}), 400
+
     try:
         with open(json_file, "r") as f:
             address_map = json.load(f)  # { "Alice": "0x123...", ... }
     except Exception as e:
         return jsonify({"error": f"Failed to load file: {str(e)}"}), 400
 
-    minted = []
-    failed = []
-
-    for name, addr in address_map.items():
+    def generate():
+        minted = 0
+        failed = 0
         try:
-            checksum_addr = Web3.to_checksum_address(addr)
-
-            if faucet_enabled:
-                # Send 20 ETH from admin account
-                tx = {
-                    "from": accountAddress,
-                    "to": checksum_addr,
-                    "value": web3.to_wei(fund_amount_eth, "ether"),
-                    "gas": 21000,
-                    "gasPrice": web3.to_wei("2", "gwei"),
-                    "nonce": get_nonce(accountAddress)
-                }
-                signed_txn = web3.eth.account.sign_transaction(tx, private_key=privateKey)
-                web3.eth.send_raw_transaction(signed_txn.raw_transaction)
-
-            # Mint NFT to user
-            token_uri = f"https://example.com/metadata/{name}.json"
-            nonce = get_nonce(accountAddress)
-            txn = contract.functions.mintBadge(checksum_addr, badge_type, token_uri).build_transaction({
-                "from": accountAddress,
-                "nonce": nonce,
-                "gas": 300000,
-                "gasPrice": web3.to_wei("2", "gwei")
-            })
-            signed_txn = web3.eth.account.sign_transaction(txn, private_key=privateKey)
-            tx_hash = web3.eth.send_raw_transaction(signed_txn.raw_transaction)
-
-            minted.append({
-                "name": name,
-                "address": addr,
-                "tx_hash": web3.to_hex(tx_hash)
-            })
-
+            for result in batch_minter.run(address_map, badge_type, faucet_enabled, fund_amount_eth):
+                if result["status"] == "minted":
+                    minted += 1
+                else:
+                    failed += 1
+                yield json.dumps(result) + "\n"
         except Exception as e:
-            failed.append({
-                "name": name,
-                "address": addr,
-                "error": str(e)
-            })
+            yield json.dumps({"error": str(e)}) + "\n"
+
+        yield json.dumps({
+            "summary": {
+                "minted": minted,
+                "failed": failed,
+                "total_processed": len(address_map),
+                "faucet_enabled": faucet_enabled
+            }
+        }) + "\n"
 
-    return jsonify({
-        "minted": minted,
-        "failed": failed,
-        "total_processed": len(address_map),
-        "faucet_enabled": faucet_enabled
-    })
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+if __name__ == "__main__":
+    start_background_work()
+    app.run(debug=True)
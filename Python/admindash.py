@@ -5,7 +5,10 @@ from datetime import datetime, timedelta
 import pandas as pd
 from web3 import Web3
 import os
+import time
+import uuid
 from dotenv import load_dotenv
+from metadata_cache import MetadataCache
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +19,11 @@ BLOCKCHAIN_RPC = "http://127.0.0.1:8545"
 CONTRACT_ADDRESS = os.getenv("SMART_CONTRACT_ADDRESS")
 PRIVATE_KEY = os.getenv("ACCOUNT_PRIVATE_KEY")
 ACCOUNT_ADDRESS = os.getenv("ACCOUNT_ADDRESS")
+METADATA_CACHE_DIR = "./metadata_cache"
+API_TIMEOUT = (5, 30)  # connect / read seconds for API calls
+API_RETRIES = 3  # ledger-changing calls carry an Idempotency-Key, so retrying them is safe
+UPLOAD_POLL_INTERVAL = 2  # seconds between /upload_status checks while a certificate is pinned
+UPLOAD_WAIT_TIMEOUT = 120
 
 # Badge token requirements
 BADGE_TOKEN_REQUIREMENTS = {
@@ -59,6 +67,17 @@ def init_web3():
     except:
         return None
 
+@st.cache_resource
+def init_metadata_cache():
+    return MetadataCache(METADATA_CACHE_DIR)
+
+def fetch_metadata(metadata_uri):
+    """Fetch badge metadata through the CID cache, None if the gateway fails"""
+    try:
+        return init_metadata_cache().get(metadata_uri)
+    except Exception:
+        return None
+
 def calculate_signup_bonus(signup_date):
     """Calculate signup bonus based on days since signup"""
     if not signup_date:
@@ -74,25 +93,59 @@ def calculate_signup_bonus(signup_date):
     else:
         return 0
 
+def post_idempotent(path, payload, action):
+    """
+    POST a ledger-changing request with an Idempotency-Key, retrying timeouts and
+    5xx responses. The key is kept in session state until the call succeeds, so
+    a Streamlit rerun or a second click for the same action replays the first
+    request instead of repeating it. A 202 keeps the key too: the caller calls
+    forget_idempotency_key() once the accepted work has finished.
+    """
+    state_key = f"idempotency_key:{action}"
+    key = st.session_state.setdefault(state_key, uuid.uuid4().hex)
+    for attempt in range(API_RETRIES + 1):
+        try:
+            response = requests.post(f"{API_BASE_URL}{path}", json=payload,
+                                     headers={"Idempotency-Key": key}, timeout=API_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == API_RETRIES:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+            continue
+        # 409 means the first attempt is still running; ask again for its result
+        if (response.status_code >= 500 or response.status_code == 409) and attempt < API_RETRIES:
+            time.sleep(0.5 * 2 ** attempt)
+            continue
+        if response.status_code < 500 and response.status_code not in (202, 409):
+            forget_idempotency_key(action)
+        return response
+
+def forget_idempotency_key(action):
+    st.session_state.pop(f"idempotency_key:{action}", None)
+
+def wait_for_upload(status_url):
+    """Poll an upload accepted with 202 until its metadata is pinned; returns the final status"""
+    deadline = time.monotonic() + UPLOAD_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(UPLOAD_POLL_INTERVAL)
+        try:
+            response = requests.get(f"{API_BASE_URL}{status_url}", timeout=API_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            continue
+        if response.status_code == 200 and response.json().get("status") in ("complete", "failed"):
+            return response.json()
+    return None
+
 def send_tokens_to_user(user_address, token_amount):
     """Send tokens to user via API"""
     try:
-        # Initialize user if not exists
-        response = requests.post(f"{API_BASE_URL}/initialize_user", 
-                               json={"user_address": user_address})
-        
-        # Add tokens to user balance
-        # Note: This is a simplified approach. In practice, you might want a dedicated endpoint
-        # for admin token allocation
+        # admin_add_tokens creates the account if needed
         payload = {
             "user_address": user_address,
             "token_amount": token_amount
         }
-        
-        # For now, we'll use the existing add_tokens function through a custom endpoint
-        # You'll need to add this endpoint to your Flask app
-        response = requests.post(f"{API_BASE_URL}/admin_add_tokens", json=payload)
-        
+        response = post_idempotent("/admin_add_tokens", payload, f"add_tokens:{user_address}:{token_amount}")
+
         if response.status_code == 200:
             return True, response.json()
         else:
@@ -140,13 +193,23 @@ def mint_badge_for_user(user_address, badge_type, student_name, class_semester,
             "user_address": user_address
         }
         
-        metadata_response = requests.post(f"{API_BASE_URL}/uploadMetadata", 
-                                        json=metadata_payload)
-        
-        if metadata_response.status_code != 200:
+        upload_action = f"upload_metadata:{user_address}:{badge_type}"
+        metadata_response = post_idempotent("/uploadMetadata", metadata_payload, upload_action)
+
+        if metadata_response.status_code == 202:
+            # Pinata is slow; the tokens are spent, so wait for the pin rather than paying again
+            status = wait_for_upload(metadata_response.json()["status_url"])
+            if status is None:
+                return False, "Certificate upload is still in progress, try again shortly to resume it"
+            forget_idempotency_key(upload_action)
+            if status["status"] != "complete":
+                return False, f"Metadata upload failed: {status['last_error']}"
+            metadata_uri = status["metadata_uri"]
+        elif metadata_response.status_code == 200:
+            metadata_uri = metadata_response.json().get("metadata_uri")
+        else:
             return False, f"Metadata upload failed: {metadata_response.text}"
-        
-        metadata_uri = metadata_response.json().get("metadata_uri")
+
         # Then mint the badge
         mint_payload = {
             "badge_type": badge_type,
@@ -155,9 +218,11 @@ def mint_badge_for_user(user_address, badge_type, student_name, class_semester,
             "user_address": user_address
         }
         
-        mint_response = requests.post(f"{API_BASE_URL}/mintBadge", json=mint_payload)
-        
-        if mint_response.status_code == 200:
+        mint_action = f"mint:{user_address}:{badge_type}:{metadata_uri}"
+        mint_response = post_idempotent("/mintBadge", mint_payload, mint_action)
+
+        if mint_response.status_code in (200, 202):
+            forget_idempotency_key(mint_action)
             result = mint_response.json()
             result["metadata_uri"] = metadata_uri 
             return True, result
@@ -324,9 +389,8 @@ def badge_management_page(user_name, user_address):
                     if metadata_uri:
                         try:
                             # Fetch metadata JSON from IPFS
-                            metadata_response = requests.get(metadata_uri)
-                            if metadata_response.status_code == 200:
-                                metadata = metadata_response.json()
+                            metadata = fetch_metadata(metadata_uri)
+                            if metadata is not None:
                                 cert_url = metadata.get("pinataContent", {}).get("certificate_url")
 
                                 # If not found, assume top-level
@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+
+from web3.exceptions import BlockNotFound
+
+
+class BadgeIndexer:
+    """
+    Local index of BadgeMinted events. Each sync pulls only the blocks produced
+    since the last one, in eth_getLogs ranges of `chunk_size` blocks. The hash of
+    the last indexed block is kept too; if the node no longer has that block (a
+    restarted Hardhat node or a reorg, at any height) the index is rebuilt.
+    """
+
+    def __init__(self, contract, db_path, start_block=0, chunk_size=2000):
+        self.contract = contract
+        self.web3 = contract.w3
+        self.db_path = db_path
+        self.start_block = start_block
+        self.chunk_size = chunk_size
+        self._sync_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS badges (
+                    token_id INTEGER PRIMARY KEY,
+                    recipient TEXT NOT NULL,
+                    badge_type TEXT NOT NULL,
+                    metadata_uri TEXT NOT NULL,
+                    block_number INTEGER NOT NULL,
+                    tx_hash TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_badges_recipient ON badges (recipient);
+                CREATE TABLE IF NOT EXISTS indexer_state (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def last_block(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM indexer_state WHERE key = 'last_block'").fetchone()
+        return row["value"] if row else self.start_block - 1
+
+    def _block_hash(self, block_number):
+        return self.web3.to_hex(self.web3.eth.get_block(block_number)["hash"])
+
+    def _on_indexed_chain(self, last, head):
+        """Whether the node still has the block the index stopped at"""
+        if last < self.start_block:
+            return True
+        if last > head:
+            return False
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM indexer_state WHERE key = 'last_block_hash'").fetchone()
+        if row is None:
+            return True
+        try:
+            return self._block_hash(last) == row["value"]
+        except BlockNotFound:
+            return False
+
+    def sync(self):
+        """Catch the index up to the chain head and return the last indexed block"""
+        with self._sync_lock:
+            last = self.last_block()
+            head = self.web3.eth.block_number
+            from_block = last + 1
+            if not self._on_indexed_chain(last, head):
+                # The node was restarted or reorged, so the index describes a chain that is gone
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM badges")
+                    conn.execute("DELETE FROM indexer_state")
+                from_block = self.start_block
+            while from_block <= head:
+                to_block = min(from_block + self.chunk_size - 1, head)
+                # Hashed before the logs are read: a reorg in between leaves a hash the next sync rejects
+                to_block_hash = self._block_hash(to_block)
+                logs = self.contract.events.BadgeMinted.get_logs(from_block=from_block, to_block=to_block)
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO badges VALUES (?, ?, ?, ?, ?, ?)",
+                        [(
+                            log["args"]["tokenId"],
+                            log["args"]["recipient"],
+                            log["args"]["badgeType"],
+                            log["args"]["metadataURI"],
+                            log["blockNumber"],
+                            self.web3.to_hex(log["transactionHash"])
+                        ) for log in logs]
+                    )
+                    # Progress is stored with the rows so a crash never skips a range
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO indexer_state (key, value) VALUES (?, ?)",
+                        [("last_block", to_block), ("last_block_hash", to_block_hash)]
+                    )
+                from_block = to_block + 1
+            return head
+
+    def badges(self, recipient=None):
+        """Indexed badges in token id order, optionally for a single recipient"""
+        query = "SELECT token_id, recipient, badge_type, metadata_uri FROM badges"
+        params = ()
+        if recipient:
+            query += " WHERE recipient = ?"
+            params = (recipient,)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY token_id", params).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+# Columns pulled out of each record so lookups by them hit an index
+INDEXED_FIELDS = ("user_address", "badge_type", "class_semester")
+
+
+class BadgeRecordStore:
+    """
+    Append-only store for the badge records that used to be rewritten into
+    StudentBadgeData.json on every mint. Records live in SQLite in WAL mode with
+    synchronous=NORMAL, so appends never rewrite earlier data and fsyncs are
+    batched at checkpoints instead of paid on every commit.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS badge_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_address TEXT,
+                badge_type TEXT,
+                class_semester TEXT,
+                record TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_records_user ON badge_records (user_address);
+            CREATE INDEX IF NOT EXISTS idx_records_badge ON badge_records (badge_type);
+            CREATE INDEX IF NOT EXISTS idx_records_class ON badge_records (class_semester);
+            CREATE TABLE IF NOT EXISTS imported_files (
+                path TEXT PRIMARY KEY,
+                records INTEGER NOT NULL,
+                imported_at TEXT NOT NULL
+            );
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(record):
+        return tuple(record.get(field) for field in INDEXED_FIELDS) + (
+            json.dumps(record),
+            datetime.now().isoformat()
+        )
+
+    def append(self, record):
+        """Store one record and return its id"""
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "INSERT INTO badge_records (user_address, badge_type, class_semester, record, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                self._row(record)
+            )
+        return cursor.lastrowid
+
+    def get(self, record_id):
+        """One record by id, or None"""
+        row = self._conn().execute("SELECT record FROM badge_records WHERE id = ?", (record_id,)).fetchone()
+        return dict(json.loads(row[0]), record_id=record_id) if row else None
+
+    def update(self, record_id, **fields):
+        """Merge `fields` into a stored record in place; False if there is no such record"""
+        assignments = ["record = json_patch(record, ?)"]
+        params = [json.dumps(fields)]
+        for field in INDEXED_FIELDS:
+            if field in fields:
+                assignments.append(f"{field} = ?")
+                params.append(fields[field])
+        with self._conn() as conn:
+            cursor = conn.execute(
+                f"UPDATE badge_records SET {', '.join(assignments)} WHERE id = ?",
+                params + [record_id]
+            )
+        return cursor.rowcount > 0
+
+    def delete(self, record_id):
+        with self._conn() as conn:
+            cursor = conn.execute("DELETE FROM badge_records WHERE id = ?", (record_id,))
+        return cursor.rowcount > 0
+
+    def find(self, **filters):
+        """Records matching every given indexed field, oldest first, e.g. find(user_address=...)"""
+        unknown = set(filters) - set(INDEXED_FIELDS)
+        if unknown:
+            raise ValueError(f"Not an indexed field: {', '.join(sorted(unknown))}")
+        query = "SELECT id, record FROM badge_records"
+        if filters:
+            query += " WHERE " + " AND ".join(f"{field} = ?" for field in filters)
+        rows = self._conn().execute(query + " ORDER BY id", tuple(filters.values())).fetchall()
+        return [dict(json.loads(record), record_id=record_id) for record_id, record in rows]
+
+    def records_since(self, last_id):
+        """Records appended after `last_id`, oldest first"""
+        rows = self._conn().execute(
+            "SELECT id, record FROM badge_records WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+        return [dict(json.loads(record), record_id=record_id) for record_id, record in rows]
+
+    def distinct(self, field):
+        """Distinct values of an indexed field"""
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"Not an indexed field: {field}")
+        rows = self._conn().execute(f"SELECT DISTINCT {field} FROM badge_records").fetchall()
+        return [row[0] for row in rows]
+
+    def import_json(self, json_path):
+        """
+        One-shot import of a StudentBadgeData.json array. A file that was already
+        imported is skipped, so this is safe to call on every startup.
+        Returns the number of records imported.
+        """
+        path = os.path.abspath(json_path)
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r") as f:
+            records = json.load(f)
+        conn = self._conn()
+        with conn:
+            # Taking the write lock first stops two workers importing the same file at startup
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM imported_files WHERE path = ?", (path,)).fetchone():
+                return 0
+            conn.executemany(
+                "INSERT INTO badge_records (user_address, badge_type, class_semester, record, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [self._row(record) for record in records]
+            )
+            conn.execute(
+                "INSERT INTO imported_files (path, records, imported_at) VALUES (?, ?, ?)",
+                (path, len(records), datetime.now().isoformat())
+            )
+        return len(records)
+
+
+if __name__ == "__main__":
+    # python badge_records.py <StudentBadgeData.json> <records.db>
+    if len(sys.argv) != 3:
+        print("Usage: python badge_records.py <StudentBadgeData.json> <records.db>")
+        sys.exit(1)
+    imported = BadgeRecordStore(sys.argv[2]).import_json(sys.argv[1])
+    print(f"Imported {imported} records")
@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from eth_account import Account
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from nonce_manager import is_already_known
+
+# Below this many transactions a process pool costs more to start than it saves:
+# a spawned worker takes ~2s to boot, a signature ~7ms
+PROCESS_POOL_THRESHOLD = 256
+
+
+def sign_raw_transaction(txn, private_key):
+    """Sign a transaction dict and return (raw bytes, hash hex); runs in worker processes"""
+    signed_txn = Account.sign_transaction(txn, private_key)
+    return bytes(signed_txn.raw_transaction), Web3.to_hex(signed_txn.hash)
+
+
+class BatchMinter:
+    """
+    Funds and mints to a whole roster in one pipelined pass: every transaction
+    is built first, then nonces are reserved for all of them at once, everything
+    is signed before the first send, sends go out in bursts and receipts are
+    awaited together.
+
+    Large rosters are signed on a process pool started with "spawn", like
+    CertificateService: the API process already runs threads that hold locks and
+    SQLite connections, which a forked child would inherit.
+    """
+
+    def __init__(self, web3, contract, nonce_manager, gas_price_gwei="2", burst_size=50,
+                 poll_interval=0.5, receipt_timeout=120, max_workers=None, mp_context="spawn"):
+        self.web3 = web3
+        self.contract = contract
+        self.nonce_manager = nonce_manager
+        self.gas_price = web3.to_wei(gas_price_gwei, "gwei")
+        self.burst_size = burst_size
+        self.poll_interval = poll_interval
+        self.receipt_timeout = receipt_timeout
+        self.max_workers = max_workers or os.cpu_count() or 1
+        if isinstance(mp_context, str):
+            mp_context = multiprocessing.get_context(mp_context)
+        self.mp_context = mp_context
+
+    def run(self, address_map, badge_type, faucet_enabled=False, fund_amount_eth=20):
+        """
+        Process every name -> address entry and yield one result dict per address
+        as soon as its outcome is known.
+        """
+        entries = []
+        for name, addr in address_map.items():
+            try:
+                entries.append({"name": name, "address": addr, "checksum": Web3.to_checksum_address(addr)})
+            except ValueError as e:
+                yield {"name": name, "address": addr, "status": "failed", "error": str(e)}
+        if not entries:
+            return
+
+        # Bad request values fail here, before any nonce is taken
+        txns = self._build(entries, badge_type, faucet_enabled, fund_amount_eth)
+        nonces = self.nonce_manager.reserve(len(txns))
+        for (_, _, txn), nonce in zip(txns, nonces):
+            txn["nonce"] = nonce
+        try:
+            signed = self._sign(txns)
+        except BaseException:
+            for nonce in nonces:
+                self.nonce_manager.settle(nonce, sent=False)
+            raise
+        yield from self._send_and_wait(entries, txns, signed)
+
+    def _build(self, entries, badge_type, faucet_enabled, fund_amount_eth):
+        """Transactions without nonces, one (entry index, kind, txn) per send"""
+        chain_id = self.web3.eth.chain_id
+        fund_value = self.web3.to_wei(fund_amount_eth, "ether") if faucet_enabled else 0
+        txns = []
+        for index, entry in enumerate(entries):
+            if faucet_enabled:
+                txns.append((index, "fund", {
+                    "from": self.nonce_manager.address,
+                    "to": entry["checksum"],
+                    "value": fund_value,
+                    "gas": 21000,
+                    "gasPrice": self.gas_price,
+                    "chainId": chain_id
+                }))
+            token_uri = f"https://example.com/metadata/{entry['name']}.json"
+            txns.append((index, "mint", self.contract.functions.mintBadge(
+                entry["checksum"], badge_type, token_uri
+            ).build_transaction({
+                "from": self.nonce_manager.address,
+                "gas": 300000,
+                "gasPrice": self.gas_price,
+                "chainId": chain_id
+            })))
+        return txns
+
+    def _sign(self, txns):
+        private_key = self.nonce_manager.private_key
+        if len(txns) < PROCESS_POOL_THRESHOLD or self.max_workers < 2:
+            return [sign_raw_transaction(txn, private_key) for _, _, txn in txns]
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.mp_context) as pool:
+            return list(pool.map(
+                sign_raw_transaction,
+                [txn for _, _, txn in txns],
+                [private_key] * len(txns),
+                chunksize=16
+            ))
+
+    def _send_and_wait(self, entries, txns, signed):
+        results = [{"name": e["name"], "address": e["address"], "status": "pending"} for e in entries]
+        awaiting = {}
+        send_error = None
+
+        for start in range(0, len(txns), self.burst_size):
+            for (index, kind, txn), (raw_transaction, tx_hash) in zip(
+                txns[start:start + self.burst_size], signed[start:start + self.burst_size]
+            ):
+                result = results[index]
+                nonce = txn["nonce"]
+                if send_error is not None:
+                    # Every later nonce is stuck behind the failed one, so stop sending
+                    result.update(status="failed", error=f"Not sent after earlier failure: {send_error}")
+                    self.nonce_manager.settle(nonce, sent=False)
+                    continue
+                if result["status"] == "failed":
+                    self.nonce_manager.settle(nonce, sent=False)
+                    continue
+                try:
+                    self.web3.eth.send_raw_transaction(raw_transaction)
+                except Exception as e:
+                    if not is_already_known(e):
+                        send_error = str(e)
+                        result.update(status="failed", error=send_error)
+                        self.nonce_manager.settle(nonce, sent=False)
+                        continue
+                self.nonce_manager.settle(nonce, sent=True)
+                result[f"{kind}_tx_hash"] = tx_hash
+                awaiting[tx_hash] = (index, kind)
+
+        # Entries that never reached the node are reported before we wait on receipts
+        done = set()
+        awaiting_indices = {index for index, _ in awaiting.values()}
+        for index, result in enumerate(results):
+            if result["status"] == "failed" and index not in awaiting_indices:
+                done.add(index)
+                yield result
+
+        outstanding = {}
+        for tx_hash, (index, _) in awaiting.items():
+            outstanding.setdefault(index, set()).add(tx_hash)
+
+        deadline = time.monotonic() + self.receipt_timeout
+        while awaiting:
+            for tx_hash, (index, kind) in list(awaiting.items()):
+                try:
+                    receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    continue
+                del awaiting[tx_hash]
+                outstanding[index].discard(tx_hash)
+                if receipt["status"] != 1:
+                    results[index].update(status="failed", error=f"{kind} transaction reverted")
+                if not outstanding[index]:
+                    if results[index]["status"] == "pending":
+                        results[index]["status"] = "minted"
+                    done.add(index)
+                    yield results[index]
+
+            if not awaiting:
+                break
+            if time.monotonic() > deadline:
+                for index, hashes in outstanding.items():
+                    if hashes and index not in done:
+                        results[index].update(status="failed", error="Timed out waiting for receipt")
+                        done.add(index)
+                        yield results[index]
+                break
+            time.sleep(self.poll_interval)
@@ -0,0 +1,222 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+from certificate_renderer import FONT_FILE, RENDER_SETTINGS, TEMPLATE_FILE
+from certificate_service import CertificateService
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(BASE_DIR, "generated")
+MANIFEST_FILE = "manifest.json"
+# Resolver links (CERTIFICATE_RESOLVER_URL/<record_id>) only exist once /uploadMetadata creates
+# the badge record, so pre-rendered QR codes carry the wallet address unless a row has a link
+DEFAULT_LINK_TEMPLATE = "ethereum:{user_address}"
+
+CSV_FIELDS = ("student_name", "class_semester", "university", "badge_type")
+
+
+def sanitize_filename(text):
+    # Output file names only; the API renders in memory and never reads these files
+    return re.sub(r'[^\w\-]', '_', text)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_csv(path):
+    """Rows with student_name, class_semester, university, badge_type and optional user_address / link"""
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    for line, row in enumerate(rows, start=2):
+        missing = [field for field in CSV_FIELDS if not (row.get(field) or "").strip()]
+        if missing:
+            raise ValueError(f"{path}:{line}: missing {', '.join(missing)}")
+    return [{key: (value or "").strip() for key, value in row.items() if key} for row in rows]
+
+
+def load_roster(path, university, badge_type=None, assignments_path=None):
+    """
+    One certificate per team in a teamWallets.json roster. Badges come from an
+    assignments JSON ({team: badge_type}), falling back to `badge_type`.
+    """
+    with open(path, "r") as f:
+        roster = json.load(f)
+    assignments = {}
+    if assignments_path:
+        with open(assignments_path, "r") as f:
+            assignments = json.load(f)
+
+    rows = []
+    for team, address in roster.items():
+        badge = assignments.get(team, badge_type)
+        if not badge:
+            print(f"Skipping {team}: no badge assigned")
+            continue
+        rows.append({
+            "student_name": team,
+            "class_semester": team,
+            "university": university,
+            "badge_type": badge,
+            "user_address": address,
+        })
+    return rows
+
+
+class BulkCertificateJob:
+    """
+    Renders a whole cohort in parallel on a CertificateService. Each output's
+    inputs (text fields, QR link, date, template, font and RENDER_SETTINGS) are
+    hashed and recorded in a manifest next to the PNGs; rows whose hash matches the
+    manifest and whose file still exists are skipped on the next run.
+
+    These are standalone certificates for printing ahead of a ceremony. Their QR
+    code is not the resolver link, and /uploadMetadata does not reuse them: it
+    renders its own certificate for the record it creates.
+    """
+
+    def __init__(self, output_dir=OUTPUT_DIR, link_template=DEFAULT_LINK_TEMPLATE, date=None,
+                 max_workers=None, force=False):
+        self.output_dir = output_dir
+        self.link_template = link_template
+        self.date = date or datetime.now()
+        self.max_workers = max_workers
+        self.force = force
+        self.manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+        # Changing the template, font, layout, QR or PNG settings invalidates every previous render
+        self._render_digest = hashlib.sha256(json.dumps([
+            file_digest(TEMPLATE_FILE),
+            file_digest(FONT_FILE),
+            RENDER_SETTINGS
+        ], sort_keys=True).encode()).hexdigest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def plan(self, row):
+        """Resolve one input row to its output file, render arguments and content hash"""
+        try:
+            link = row.get("link") or self.link_template.format(**row)
+        except KeyError as e:
+            raise ValueError(f"{row['student_name']}: no link column and no {e} for the link template")
+        output_file = os.path.join(
+            self.output_dir,
+            f"generated_{sanitize_filename(row['student_name'])}_{sanitize_filename(row['badge_type'])}.png"
+        )
+        args = (row["student_name"], row["class_semester"], row["university"], link, row["badge_type"])
+        content_hash = hashlib.sha256(json.dumps([
+            self._render_digest,
+            args,
+            self.date.strftime("%Y-%m-%d")
+        ]).encode()).hexdigest()
+        return output_file, args, content_hash
+
+    def run(self, rows):
+        """Render every row that changed since the last run; returns a summary dict"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = self._load_manifest()
+
+        pending = {}
+        skipped = 0
+        for row in rows:
+            output_file, args, content_hash = self.plan(row)
+            name = os.path.basename(output_file)
+            if name in pending:
+                print(f"Duplicate output {name}, keeping the first row")
+                continue
+            entry = manifest.get(name)
+            if not self.force and entry and entry["hash"] == content_hash and os.path.exists(output_file):
+                skipped += 1
+                continue
+            pending[name] = (output_file, args, content_hash, row)
+
+        rendered, failed = 0, []
+        if pending:
+            service = CertificateService(max_workers=self.max_workers)
+            futures = {
+                name: service.submit(output_file, *args, date=self.date)
+                for name, (output_file, args, _, _) in pending.items()
+            }
+            for name, future in futures.items():
+                output_file, args, content_hash, row = pending[name]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed.append({"file": name, "error": str(e)})
+                    print(f"Failed {name}: {e}")
+                    continue
+                rendered += 1
+                manifest[name] = {
+                    "hash": content_hash,
+                    "student_name": row["student_name"],
+                    "class_semester": row["class_semester"],
+                    "university": row["university"],
+                    "badge_type": row["badge_type"],
+                    "user_address": row.get("user_address", ""),
+                    "link": args[3],
+                    "date": self.date.strftime("%Y-%m-%d"),
+                    "rendered_at": datetime.now().isoformat()
+                }
+            self._save_manifest(manifest)
+
+        return {"rendered": rendered, "skipped": skipped, "failed": failed, "manifest": self.manifest_path}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Pre-render certificates for a whole cohort. The QR codes carry the link column or "
+                    "--link-template, not the API's resolver link, and /uploadMetadata does not reuse these files."
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="CSV with student_name, class_semester, university, badge_type "
+                                      "and optional user_address, link columns")
+    source.add_argument("--roster", help="teamWallets.json roster (team -> wallet address)")
+    parser.add_argument("--assignments", help="JSON mapping team -> badge_type, used with --roster")
+    parser.add_argument("--badge", help="Badge type for roster teams missing from --assignments")
+    parser.add_argument("--university", default="", help="University printed on roster certificates")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--link-template", default=DEFAULT_LINK_TEMPLATE,
+                        help="QR link for rows without a link column, formatted with the row's fields")
+    parser.add_argument("--date", help="Award date printed on the certificates (YYYY-MM-DD), default today")
+    parser.add_argument("--workers", type=int, help="Render processes, default one per CPU")
+    parser.add_argument("--force", action="store_true", help="Re-render even if the inputs are unchanged")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        rows = load_csv(args.csv)
+    else:
+        rows = load_roster(args.roster, args.university, args.badge, args.assignments)
+
+    job = BulkCertificateJob(
+        output_dir=args.output_dir,
+        link_template=args.link_template,
+        date=datetime.strptime(args.date, "%Y-%m-%d") if args.date else None,
+        max_workers=args.workers,
+        force=args.force
+    )
+    summary = job.run(rows)
+    print(f"Rendered {summary['rendered']}, skipped {summary['skipped']} unchanged, "
+          f"{len(summary['failed'])} failed. Manifest: {summary['manifest']}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import io
+import os
+from datetime import datetime
+from functools import lru_cache
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_FILE = os.path.join(BASE_DIR, "fonts", "dejavu-sans-webfont.ttf")
+TEMPLATE_FILE = os.path.join(BASE_DIR, "certificate_of_achievement.png")
+
+TEXT_COLOR = (255, 255, 255)
+QR_BACK_COLOR = (54, 151, 193)
+QR_SIZE = (250, 250)
+QR_POSITION = (1145, 580)
+QR_BORDER = 4  # quiet zone in modules; any pixels left after integer scaling widen it
+QR_CACHE_SIZE = 512
+# Palette index 0 is the light background, 1 the dark modules (drawn white on the blue template)
+QR_PALETTE = list(QR_BACK_COLOR) + [255, 255, 255]
+# zlib level 1 encodes several times faster than the default 6 for ~20% larger files
+PNG_COMPRESS_LEVEL = 1
+
+# field -> (position, font size, anchor); a None x is replaced by the horizontal centre
+CERTIFICATE_LAYOUT = {
+    "name": ((None, 680), 45, "ma"),
+    "team_name": ((728, 780), 20, "la"),
+    "branch": ((680, 812), 20, "la"),
+    "date": ((467, 985), 35, "la"),
+    "badge_name": ((745, 528), 30, "la"),
+}
+
+# Everything besides the template and font that shapes the output PNG; cached renders
+# (bulk_certificates' manifest) are invalidated when it changes. Bump RENDER_VERSION
+# when drawing code changes the output without touching a constant.
+RENDER_VERSION = 1
+RENDER_SETTINGS = {
+    "version": RENDER_VERSION,
+    "layout": CERTIFICATE_LAYOUT,
+    "text_color": TEXT_COLOR,
+    "qr_size": QR_SIZE,
+    "qr_position": QR_POSITION,
+    "qr_border": QR_BORDER,
+    "qr_palette": QR_PALETTE,
+    "png_compress_level": PNG_COMPRESS_LEVEL,
+}
+
+
+@lru_cache(maxsize=None)
+def load_font(font_path, size):
+    """TrueType fonts are parsed once per (path, size) for the life of the process"""
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def render_qr(link, size=QR_SIZE):
+    """
+    QR code for `link` at exactly `size` pixels. The module matrix is scaled by
+    the largest whole factor that fits, with nearest-neighbour so modules stay
+    crisp, and centred on a background-coloured canvas, so nothing is resampled.
+    The returned image is shared, so callers must not modify it.
+
+    The LRU cache is per process and keyed by link, so it only pays off when one
+    process renders the same link again, e.g. a bulk_certificates run whose
+    --link-template prints a shared URL on every certificate. API renders each
+    carry a new record link and land on any render worker, so they always miss.
+    """
+    qr = qrcode.QRCode(border=QR_BORDER)
+    qr.add_data(link)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    modules = len(matrix)
+
+    qr_img = Image.frombytes("P", (modules, modules), bytes(cell for row in matrix for cell in row))
+    qr_img.putpalette(QR_PALETTE)
+    scale = max(1, min(size) // modules)
+    qr_img = qr_img.resize((modules * scale, modules * scale), Image.NEAREST)
+
+    canvas = Image.new("P", size, 0)
+    canvas.putpalette(QR_PALETTE)
+    canvas.paste(qr_img, ((size[0] - qr_img.width) // 2, (size[1] - qr_img.height) // 2))
+    return canvas.convert("RGB")
+
+
+class CertificateRenderer:
+    """
+    Renders certificates from a template decoded once at construction. Fonts and
+    text positions are resolved up front, so a render only copies the base
+    image, draws the variable text and pastes the QR code.
+    """
+
+    def __init__(self, template_path=TEMPLATE_FILE, font_path=FONT_FILE, layout=None, name_anchor=None):
+        if not os.path.exists(font_path):
+            raise FileNotFoundError(f"Font not found at: {font_path}")
+        if not os.path.exists(template_path):
+            raise FileNotFoundError("Certificate template image not found!")
+
+        with Image.open(template_path) as template:
+            template.load()
+            self._base = template.copy()
+
+        self._layout = {}
+        for field, (position, size, anchor) in (layout or CERTIFICATE_LAYOUT).items():
+            x, y = position
+            if field == "name" and name_anchor:
+                anchor = name_anchor
+            self._layout[field] = (
+                (self._base.width // 2 if x is None else x, y),
+                load_font(font_path, size),
+                anchor
+            )
+
+    def render(self, name, team_name, branch, link, badge_name, date=None):
+        """Return the finished certificate as a PIL image; `date` defaults to today"""
+        image = self._base.copy()
+        draw = ImageDraw.Draw(image)
+        values = {
+            "name": name.title(),
+            "team_name": team_name.title(),
+            "branch": branch.upper(),
+            "date": (date or datetime.now()).strftime("%B %d, %Y"),
+            "badge_name": badge_name,
+        }
+        for field, (position, font, anchor) in self._layout.items():
+            draw.text(position, values[field], font=font, fill=TEXT_COLOR, anchor=anchor)
+
+        image.paste(self.render_qr(link), QR_POSITION)
+        return image
+
+    def render_qr(self, link):
+        return render_qr(link)
+
+    def encode(self, name, team_name, branch, link, badge_name, date=None):
+        """Return the certificate as PNG bytes without touching the filesystem"""
+        buffer = io.BytesIO()
+        self.render(name, team_name, branch, link, badge_name, date).save(
+            buffer, format="PNG", compress_level=PNG_COMPRESS_LEVEL
+        )
+        return buffer.getvalue()
+
+    def save(self, output_file, name, team_name, branch, link, badge_name, date=None):
+        self.render(name, team_name, branch, link, badge_name, date).save(output_file, compress_level=PNG_COMPRESS_LEVEL)
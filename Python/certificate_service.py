@@ -0,0 +1,113 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from certificate_renderer import CertificateRenderer
+
+# Each worker process keeps its own preloaded renderer
+_worker_renderer = None
+
+
+def _init_worker(renderer_kwargs):
+    global _worker_renderer
+    _worker_renderer = CertificateRenderer(**renderer_kwargs)
+
+
+def _render_in_worker(output_file, name, team_name, branch, link, badge_name, date=None):
+    _worker_renderer.save(output_file, name, team_name, branch, link, badge_name, date)
+    return output_file
+
+
+def _encode_in_worker(name, team_name, branch, link, badge_name, date=None):
+    return _worker_renderer.encode(name, team_name, branch, link, badge_name, date)
+
+
+class CertificateQueueFull(Exception):
+    """Raised when too many certificates are already waiting to be rendered"""
+
+
+class CertificateService:
+    """
+    Renders certificates on a pool of worker processes, each holding a preloaded
+    CertificateRenderer, so PNG encoding runs on every core without holding the
+    request worker's GIL. At most `max_pending` renders are queued or running;
+    callers beyond that wait (sync) or are turned away (async).
+
+    Workers are started with "spawn" by default: forking a process that already
+    runs background threads and holds SQLite connections can copy held locks into
+    the child, and spawn behaves the same on every platform. Spawned workers
+    re-import the main module, so the APIs keep their side effects in startup hooks.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, mp_context="spawn", **renderer_kwargs):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        if isinstance(mp_context, str):
+            mp_context = multiprocessing.get_context(mp_context)
+        self.mp_context = mp_context
+        self.renderer_kwargs = renderer_kwargs
+        self._slots = threading.BoundedSemaphore(max_pending or self.max_workers * 4)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        # The pool starts on first use so importing the API doesn't spawn processes
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=self.mp_context,
+                    initializer=_init_worker,
+                    initargs=(self.renderer_kwargs,)
+                )
+            return self._pool
+
+    def _submit(self, fn, args, timeout):
+        if timeout is None:
+            acquired = self._slots.acquire()
+        elif timeout <= 0:
+            acquired = self._slots.acquire(blocking=False)
+        else:
+            acquired = self._slots.acquire(timeout=timeout)
+        if not acquired:
+            raise CertificateQueueFull("Certificate renderer is busy, try again shortly")
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def submit(self, output_file, name, team_name, branch, link, badge_name, timeout=None, date=None):
+        """
+        Queue a render to `output_file` and return a concurrent.futures.Future
+        resolving to the output path. Blocks up to `timeout` seconds for a free
+        slot, or raises CertificateQueueFull; timeout=0 never blocks.
+        """
+        return self._submit(
+            _render_in_worker, (output_file, name, team_name, branch, link, badge_name, date), timeout
+        )
+
+    def submit_encode(self, name, team_name, branch, link, badge_name, timeout=None, date=None):
+        """Like submit(), but the Future resolves to the PNG bytes and nothing is written to disk"""
+        return self._submit(_encode_in_worker, (name, team_name, branch, link, badge_name, date), timeout)
+
+    def render(self, output_file, name, team_name, branch, link, badge_name, timeout=None):
+        """Render and wait for the result"""
+        return self.submit(output_file, name, team_name, branch, link, badge_name, timeout=timeout).result()
+
+    def encode(self, name, team_name, branch, link, badge_name, timeout=None):
+        """Render to PNG bytes and wait for them"""
+        return self.submit_encode(name, team_name, branch, link, badge_name, timeout=timeout).result()
+
+    async def render_async(self, output_file, name, team_name, branch, link, badge_name):
+        """Render without blocking the event loop; a full queue fails fast instead of waiting"""
+        future = self.submit(output_file, name, team_name, branch, link, badge_name, timeout=0)
+        return await asyncio.wrap_future(future)
+
+    async def encode_async(self, name, team_name, branch, link, badge_name):
+        """PNG bytes without blocking the event loop; a full queue fails fast instead of waiting"""
+        future = self.submit_encode(name, team_name, branch, link, badge_name, timeout=0)
+        return await asyncio.wrap_future(future)
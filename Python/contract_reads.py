@@ -0,0 +1,68 @@
+import requests
+from eth_utils.abi import get_abi_output_types
+
+
+class ContractReadError(Exception):
+    """A single view call inside a batch failed or reverted"""
+
+
+class BatchReader:
+    """
+    Runs many contract view calls as one JSON-RPC batch of eth_calls, so a
+    page that needs dozens of reads costs one HTTP round trip to the node.
+    """
+
+    def __init__(self, contract, rpc_url, timeout=10):
+        self.contract = contract
+        self.rpc_url = rpc_url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def call_many(self, calls, block="latest"):
+        """
+        Execute [(function_name, args), ...] in one batch. Results come back in
+        call order; a failed call is returned as a ContractReadError instance.
+        """
+        if not calls:
+            return []
+        payload = [{
+            "jsonrpc": "2.0",
+            "id": index,
+            "method": "eth_call",
+            "params": [{"to": self.contract.address, "data": self.contract.encode_abi(name, args=list(args))}, block]
+        } for index, (name, args) in enumerate(calls)]
+
+        response = self.session.post(self.rpc_url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        replies = response.json()
+        if isinstance(replies, dict):
+            # Some nodes answer a rejected batch with a single error object
+            raise ContractReadError(replies.get("error", {}).get("message", "Batch request rejected"))
+        by_id = {reply.get("id"): reply for reply in replies}
+
+        results = []
+        for index, (name, _) in enumerate(calls):
+            reply = by_id.get(index)
+            if reply is None:
+                results.append(ContractReadError(f"{name}: no response"))
+            elif "error" in reply:
+                results.append(ContractReadError(f"{name}: {reply['error'].get('message', reply['error'])}"))
+            else:
+                results.append(self._decode(name, reply["result"]))
+        return results
+
+    def call(self, name, *args):
+        """Single read through the same path, raising on failure"""
+        result = self.call_many([(name, args)])[0]
+        if isinstance(result, ContractReadError):
+            raise result
+        return result
+
+    def _decode(self, name, result):
+        fn_abi = self.contract.get_function_by_name(name).abi
+        output_types = get_abi_output_types(fn_abi)
+        try:
+            values = self.contract.w3.codec.decode(output_types, bytes.fromhex(result[2:]))
+        except Exception as e:
+            return ContractReadError(f"{name}: could not decode result ({e})")
+        return values[0] if len(values) == 1 else list(values)
@@ -0,0 +1,151 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+import requests
+
+# Matches both gateway URLs (https://gateway.pinata.cloud/ipfs/<cid>/...) and ipfs://<cid>/...
+IPFS_PATH = re.compile(r"(?:^ipfs://|/ipfs/)([A-Za-z0-9]+(?:/[^?#]*)?)")
+
+
+def is_retryable(error):
+    """Connection trouble, timeouts, 429 and 5xx are worth another attempt"""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and (response.status_code == 429 or response.status_code >= 500)
+
+
+def ipfs_key(uri):
+    """Return the CID (plus any path inside it) addressed by a URI, or None if it isn't IPFS"""
+    match = IPFS_PATH.search(uri or "")
+    if not match:
+        return None
+    return match.group(1).rstrip("/")
+
+
+class MetadataCache:
+    """
+    Cache for IPFS metadata JSON keyed by CID. Content behind a CID never changes,
+    so entries never expire: a bounded in-memory LRU sits in front of an on-disk
+    copy that survives restarts, and concurrent misses for one CID share a single
+    gateway fetch. Non-IPFS URIs are fetched every time.
+    """
+
+    def __init__(self, cache_dir, max_entries=1024, timeout=10, max_workers=16,
+                 retries=2, backoff=0.25):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, uri):
+        """Return the metadata JSON behind `uri`, raising if it can't be fetched"""
+        key = ipfs_key(uri)
+        if key is None:
+            return self.fetch(uri)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = self._read_disk(key)
+            if value is None:
+                value = self.fetch(uri)
+                self._write_disk(key, value)
+            self._remember(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get_many(self, uris, deadline=None):
+        """
+        Yield (uri, metadata) pairs in the order of `uris`, fetching at most
+        max_workers at a time. Metadata is None for URIs that still fail after
+        retries or aren't back within `deadline` seconds, so callers get
+        partial results instead of one slow gateway stalling everything.
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="metadata")
+        futures = [self._pool.submit(self.get_with_retry, uri) for uri in uris]
+        end = time.monotonic() + deadline if deadline is not None else None
+
+        for uri, future in zip(uris, futures):
+            try:
+                remaining = None if end is None else max(0, end - time.monotonic())
+                yield uri, future.result(timeout=remaining)
+            except TimeoutError:
+                future.cancel()
+                yield uri, None
+            except Exception:
+                yield uri, None
+
+    def get_with_retry(self, uri):
+        """get() with jittered exponential backoff on transient gateway errors"""
+        attempt = 0
+        while True:
+            try:
+                return self.get(uri)
+            except Exception as e:
+                if attempt >= self.retries or not is_retryable(e):
+                    raise
+                time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+                attempt += 1
+
+    def fetch(self, uri):
+        response = requests.get(uri, timeout=self.timeout)
+        if response.status_code != 200:
+            raise requests.HTTPError(f"Metadata fetch failed: {response.status_code} - {uri}", response=response)
+        return response.json()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key.replace("/", "_") + ".json")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_disk(self, key, value):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        # Readers only ever see a complete file
+        os.replace(tmp_path, path)
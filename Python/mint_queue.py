@@ -0,0 +1,382 @@
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import requests
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+from web3.logs import DISCARD
+
+# Job states reported by /mint_status
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+CONFIRMED = "confirmed"
+REVERTED = "reverted"
+FAILED = "failed"
+
+# Send errors after which the node may still have accepted the transaction
+AMBIGUOUS_SEND_ERRORS = (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)
+
+
+class MintJob:
+    """A single badge mint tracked from enqueue until its receipt is seen"""
+
+    FIELDS = ("job_id", "recipient", "badge_type", "token_uri", "user_address", "tokens", "request_key",
+              "status", "tx_hash", "batch_index", "solo", "token_id", "error", "refunded", "created_at", "updated_at")
+
+    def __init__(self, recipient, badge_type, token_uri, user_address, tokens, request_key=None):
+        self.job_id = uuid.uuid4().hex
+        self.recipient = recipient
+        self.badge_type = badge_type
+        self.token_uri = token_uri
+        self.user_address = user_address
+        self.tokens = tokens
+        self.request_key = request_key
+        self.status = QUEUED
+        self.tx_hash = None
+        self.batch_index = None
+        self.solo = False
+        self.token_id = None
+        self.error = None
+        self.refunded = False
+        self.created_at = datetime.now().isoformat()
+        self.updated_at = self.created_at
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls.__new__(cls)
+        for field in cls.FIELDS:
+            setattr(job, field, row[field])
+        job.refunded = bool(job.refunded)
+        job.solo = bool(job.solo)
+        return job
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": QUEUED if self.status == SENDING else self.status,
+            "badge_type": self.badge_type,
+            "recipient": self.recipient,
+            "user_address": self.user_address,
+            "tx_hash": self.tx_hash,
+            "token_id": self.token_id,
+            "error": self.error,
+            "tokens_refunded": self.tokens if self.refunded else 0,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+class MintQueue:
+    """
+    Background worker that sends queued mints and tracks their receipts.
+    Jobs live in SQLite (WAL mode), so they survive a restart and any worker
+    process can report on them; workers claim queued jobs with a lease before
+    sending them. Badge tokens are handed back through
+    `refund(user_address, tokens, request_key)` when a send definitely failed
+    or the receipt shows a revert; `request_key` is the idempotency key of the
+    request that paid for the mint, if it had one.
+
+    A send that errors after signing is not refunded straight away: if the node
+    knows the transaction, or the error was a timeout or dropped connection, the
+    job is tracked as sent and only failed once `receipt_timeout` seconds pass
+    with the transaction neither mined nor in the node's pool.
+
+    When the contract exposes mintBadgeBatch, jobs arriving within `batch_window`
+    seconds of each other are sent together as one transaction of up to
+    `batch_size` badges; otherwise each job is its own mintBadge transaction.
+    A batch that reverts is not refunded: its jobs go back in the queue to be
+    sent alone, so one bad recipient only fails its own mint.
+    """
+
+    def __init__(self, web3, contract, nonce_manager, db_path, refund, batch_size=20, batch_window=0.0,
+                 poll_interval=1.0, idle_interval=5.0, lease=120.0, receipt_timeout=600.0,
+                 max_finished_jobs=10000):
+        self.web3 = web3
+        self.contract = contract
+        self.nonce_manager = nonce_manager
+        self.db_path = db_path
+        self.refund = refund
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.poll_interval = poll_interval
+        self.idle_interval = idle_interval
+        self.lease = lease
+        self.receipt_timeout = receipt_timeout
+        self.max_finished_jobs = max_finished_jobs
+        self.use_batch_mint = batch_size > 1 and any(
+            item.get("type") == "function" and item.get("name") == "mintBadgeBatch"
+            for item in contract.abi
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._submits = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS mint_jobs (
+                job_id TEXT PRIMARY KEY,
+                recipient TEXT NOT NULL,
+                badge_type TEXT NOT NULL,
+                token_uri TEXT NOT NULL,
+                user_address TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                request_key TEXT,
+                status TEXT NOT NULL,
+                tx_hash TEXT,
+                batch_index INTEGER,
+                solo INTEGER NOT NULL DEFAULT 0,
+                token_id INTEGER,
+                error TEXT,
+                refunded INTEGER NOT NULL DEFAULT 0,
+                claimed_until REAL,
+                sent_at REAL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_mint_jobs_status ON mint_jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_mint_jobs_tx ON mint_jobs (tx_hash);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, apply):
+        """Run `apply(conn)` inside one write transaction and return its result"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = apply(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def start(self):
+        """Start the worker thread once per process; it also resumes jobs left by earlier runs"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mint-queue", daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, recipient, badge_type, token_uri, user_address, tokens, request_key=None):
+        """Persist a mint and return its job straight away"""
+        job = MintJob(recipient, badge_type, token_uri, user_address, tokens, request_key)
+
+        def apply(conn):
+            conn.execute(
+                f"INSERT INTO mint_jobs ({', '.join(MintJob.FIELDS)}) VALUES ({', '.join('?' * len(MintJob.FIELDS))})",
+                tuple(getattr(job, field) for field in MintJob.FIELDS)
+            )
+            self._submits += 1
+            if self._submits % 100 == 0:
+                self._prune(conn)
+        self._write(apply)
+        self._wakeup.set()
+        self.start()
+        return job
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM mint_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return MintJob.from_row(row).to_dict() if row else None
+
+    def _prune(self, conn):
+        # Keep at most max_finished_jobs finished jobs, newest first
+        conn.execute(
+            "DELETE FROM mint_jobs WHERE job_id IN (SELECT job_id FROM mint_jobs WHERE status IN (?, ?, ?) "
+            "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (CONFIRMED, REVERTED, FAILED, self.max_finished_jobs)
+        )
+
+    def _jobs_for(self, tx_hash):
+        rows = self._conn().execute(
+            "SELECT * FROM mint_jobs WHERE tx_hash = ? AND status = ? ORDER BY batch_index", (tx_hash, SENT)
+        ).fetchall()
+        return [MintJob.from_row(row) for row in rows]
+
+    def _finish(self, jobs, status, error=None, token_ids=None, refund=False):
+        """Move sent jobs to a final state; only the caller that made the move refunds, so it happens once"""
+        now = datetime.now().isoformat()
+        for index, job in enumerate(jobs):
+            token_id = token_ids[index] if token_ids else None
+            moved = self._write(lambda conn: conn.execute(
+                "UPDATE mint_jobs SET status = ?, error = ?, token_id = ?, refunded = ?, claimed_until = NULL, "
+                "updated_at = ? WHERE job_id = ? AND status IN (?, ?, ?)",
+                (status, error, token_id, int(refund), now, job.job_id, QUEUED, SENDING, SENT)
+            ).rowcount)
+            if moved and refund:
+                self.refund(job.user_address, job.tokens, job.request_key)
+
+    def _fail(self, jobs, status, error):
+        self._finish(jobs, status, error=error, refund=True)
+
+    def _claim(self):
+        """Lease up to batch_size queued jobs to this worker"""
+        def apply(conn):
+            now = time.time()
+            # A worker died mid-send: with a signed hash the transaction may be out, so track it;
+            # without one it never left and goes back in the queue
+            conn.execute(
+                "UPDATE mint_jobs SET status = ?, sent_at = ?, claimed_until = NULL "
+                "WHERE status = ? AND claimed_until < ? AND tx_hash IS NOT NULL",
+                (SENT, now, SENDING, now)
+            )
+            conn.execute(
+                "UPDATE mint_jobs SET status = ?, claimed_until = NULL WHERE status = ? AND claimed_until < ?",
+                (QUEUED, SENDING, now)
+            )
+            rows = conn.execute(
+                "SELECT * FROM mint_jobs WHERE status = ? ORDER BY created_at LIMIT ?", (QUEUED, self.batch_size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE mint_jobs SET status = ?, claimed_until = ? WHERE job_id = ?",
+                [(SENDING, now + self.lease, row["job_id"]) for row in rows]
+            )
+            return [MintJob.from_row(row) for row in rows]
+        return self._write(apply)
+
+    def _run(self):
+        while True:
+            try:
+                sent = self._send_batch()
+                tracking = self._poll_receipts()
+            except Exception as e:
+                # A locked database or RPC trouble is retried on the next pass
+                print(f"Mint queue pass failed: {e}")
+                sent = tracking = False
+            if not sent and not tracking:
+                # Sleep until a job is submitted here, checking now and then for jobs from other workers
+                self._wakeup.wait(self.idle_interval)
+                self._wakeup.clear()
+            else:
+                time.sleep(self.poll_interval)
+
+    def _send_batch(self):
+        if self.use_batch_mint and self.batch_window:
+            # Give jobs submitted together batch_window seconds to arrive before claiming
+            time.sleep(self.batch_window)
+        jobs = self._claim()
+        batch = [job for job in jobs if not job.solo] if self.use_batch_mint else []
+        if len(batch) > 1:
+            self._send(batch, lambda nonce: self.contract.functions.mintBadgeBatch(
+                [Web3.to_checksum_address(job.recipient) for job in batch],
+                [job.badge_type for job in batch],
+                [job.token_uri for job in batch]
+            ).build_transaction({
+                "from": self.nonce_manager.address,
+                "nonce": nonce,
+                "gas": 300000 * len(batch),
+                "gasPrice": self.web3.to_wei("2", "gwei")
+            }))
+            jobs = [job for job in jobs if job.solo]
+        for job in jobs:
+            self._send([job], lambda nonce: self.contract.functions.mintBadge(
+                Web3.to_checksum_address(job.recipient), job.badge_type, job.token_uri
+            ).build_transaction({
+                "from": self.nonce_manager.address,
+                "nonce": nonce,
+                "gas": 300000,
+                "gasPrice": self.web3.to_wei("2", "gwei")
+            }))
+        return bool(jobs)
+
+    def _record_hash(self, jobs, tx_hash):
+        """Store the signed hash before sending, so a crash or an ambiguous error can still find the transaction"""
+        def apply(conn):
+            conn.executemany(
+                "UPDATE mint_jobs SET tx_hash = ?, batch_index = ?, updated_at = ? WHERE job_id = ?",
+                [(tx_hash, index, datetime.now().isoformat(), job.job_id) for index, job in enumerate(jobs)]
+            )
+        self._write(apply)
+        for job in jobs:
+            job.tx_hash = tx_hash
+
+    def _mark_sent(self, jobs, tx_hash, error=None):
+        def apply(conn):
+            conn.executemany(
+                "UPDATE mint_jobs SET status = ?, tx_hash = ?, error = ?, sent_at = ?, claimed_until = NULL, "
+                "updated_at = ? WHERE job_id = ?",
+                [(SENT, tx_hash, error, time.time(), datetime.now().isoformat(), job.job_id) for job in jobs]
+            )
+        self._write(apply)
+
+    def _known_to_node(self, tx_hash):
+        try:
+            self.web3.eth.get_transaction(tx_hash)
+            return True
+        except TransactionNotFound:
+            return False
+        except Exception:
+            # Can't tell, so assume it may be out there rather than refund a badge that could still mint
+            return True
+
+    def _send(self, jobs, build_txn):
+        try:
+            tx_hash = self.web3.to_hex(self.nonce_manager.send_transaction(
+                build_txn, on_signed=lambda signed_hash: self._record_hash(jobs, signed_hash)
+            ))
+        except Exception as e:
+            signed_hash = jobs[0].tx_hash
+            if signed_hash and (isinstance(e, AMBIGUOUS_SEND_ERRORS) or self._known_to_node(signed_hash)):
+                # The node may have taken it anyway; the receipt (or its absence) decides
+                self._mark_sent(jobs, signed_hash, error=f"Send reported an error, waiting for the receipt: {e}")
+                return
+            self._fail(jobs, FAILED, str(e))
+            return
+        self._mark_sent(jobs, tx_hash)
+
+    def _poll_receipts(self):
+        """Check every sent transaction once; returns True while any are still being tracked"""
+        rows = self._conn().execute(
+            "SELECT tx_hash, MIN(sent_at) AS sent_at FROM mint_jobs WHERE status = ? GROUP BY tx_hash", (SENT,)
+        ).fetchall()
+        for row in rows:
+            tx_hash = row["tx_hash"]
+            try:
+                receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                if time.time() - row["sent_at"] > self.receipt_timeout and not self._known_to_node(tx_hash):
+                    self._fail(self._jobs_for(tx_hash), FAILED, "Transaction was never mined")
+                continue
+            except Exception:
+                # Transient RPC trouble, try again on the next pass
+                continue
+
+            jobs = self._jobs_for(tx_hash)
+            if receipt["status"] == 1:
+                # BadgeMinted is emitted once per badge, in the order the jobs were sent
+                events = self.contract.events.BadgeMinted().process_receipt(receipt, errors=DISCARD)
+                token_ids = [events[job.batch_index]["args"]["tokenId"] if job.batch_index < len(events) else None
+                             for job in jobs]
+                self._finish(jobs, CONFIRMED, token_ids=token_ids)
+            elif len(jobs) > 1:
+                self._requeue_alone(jobs)
+            else:
+                self._fail(jobs, REVERTED, "Transaction reverted")
+        return bool(rows)
+
+    def _requeue_alone(self, jobs):
+        """Put the jobs of a reverted batch back in the queue to be sent one mintBadge each"""
+        def apply(conn):
+            conn.executemany(
+                "UPDATE mint_jobs SET status = ?, solo = 1, tx_hash = NULL, batch_index = NULL, sent_at = NULL, "
+                "error = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                [(QUEUED, "Batch transaction reverted, retrying alone", datetime.now().isoformat(), job.job_id, SENT)
+                 for job in jobs]
+            )
+        self._write(apply)
+        self._wakeup.set()
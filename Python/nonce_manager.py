@@ -0,0 +1,138 @@
+import threading
+
+# Error fragments the node returns when the nonce we sent no longer matches its view
+NONCE_ERRORS = (
+    "nonce too low",
+    "nonce too high",
+    "invalid nonce",
+    "invalid transaction nonce",
+    "replacement transaction underpriced",
+    "replacement underpriced",
+)
+# The node already holds this exact signed transaction, so the send succeeded
+ALREADY_KNOWN_ERRORS = (
+    "already known",
+    "known transaction",
+)
+
+
+def is_nonce_error(error):
+    """Check whether a send failure was caused by a stale nonce"""
+    message = str(error).lower()
+    return any(fragment in message for fragment in NONCE_ERRORS)
+
+
+def is_already_known(error):
+    """Check whether a send failed only because the node already has the transaction"""
+    message = str(error).lower()
+    return any(fragment in message for fragment in ALREADY_KNOWN_ERRORS)
+
+
+class NonceManager:
+    """
+    Tracks the pending nonce of a single signer in-process so transactions can be
+    signed and sent back to back without an eth_getTransactionCount round trip each.
+
+    Every reserved nonce is outstanding until it is settled as sent or unsent.
+    An unsent nonce is taken back when nothing was handed out after it; otherwise
+    it leaves a gap and the counter is reloaded from the node once no other
+    reservation is outstanding, so a reload never hands out a nonce twice. A
+    forced reload while reservations are outstanding only moves the counter forward.
+    """
+
+    def __init__(self, web3, address, private_key, max_retries=2):
+        self.web3 = web3
+        self.address = address
+        self.private_key = private_key
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._next_nonce = None
+        self._outstanding = set()
+        self._stale = False
+
+    def _load(self):
+        self._next_nonce = self.web3.eth.get_transaction_count(self.address, "pending")
+        self._stale = False
+        return self._next_nonce
+
+    def sync(self, force=False):
+        """
+        Reload the pending nonce from the node. While reservations are
+        outstanding the reload is deferred until they are settled. With `force`
+        (the node rejected our nonce outright) the counter is moved up to the
+        node's count at once, but never back below a nonce already handed out.
+        """
+        with self._lock:
+            if not self._outstanding:
+                return self._load()
+            self._stale = True
+            if not force:
+                return None
+            pending = self.web3.eth.get_transaction_count(self.address, "pending")
+            self._next_nonce = max(self._next_nonce or 0, pending)
+            return self._next_nonce
+
+    def next_nonce(self):
+        """Hand out the next nonce, loading it from the node on first use"""
+        return self.reserve(1)[0]
+
+    def reserve(self, count):
+        """Atomically hand out `count` sequential nonces; settle() each one afterwards"""
+        with self._lock:
+            if self._next_nonce is None:
+                self._load()
+            first = self._next_nonce
+            self._next_nonce += count
+            self._outstanding.update(range(first, first + count))
+            return list(range(first, first + count))
+
+    def settle(self, nonce, sent):
+        """Report whether a reserved nonce reached the node"""
+        with self._lock:
+            self._outstanding.discard(nonce)
+            if not sent:
+                if self._next_nonce is not None and nonce == self._next_nonce - 1:
+                    self._next_nonce = nonce
+                else:
+                    self._stale = True
+            if self._stale and not self._outstanding:
+                # Reloaded from the node on the next reserve()
+                self._next_nonce = None
+                self._stale = False
+
+    def sign(self, txn):
+        return self.web3.eth.account.sign_transaction(txn, private_key=self.private_key)
+
+    def send_transaction(self, build_txn, on_signed=None):
+        """
+        Build, sign and send a transaction with a freshly allocated nonce.
+        `build_txn` receives the nonce and returns the transaction dict, and
+        `on_signed` (if given) receives the signed hash before it is sent, so a
+        caller can look the transaction up if the send errors ambiguously. If
+        any step fails the nonce is settled as unsent; on a nonce error the
+        manager resyncs with the node and retries with a new nonce. A node that
+        already knows the transaction has accepted it, so that counts as sent.
+        """
+        attempt = 0
+        while True:
+            nonce = self.next_nonce()
+            signed_txn = None
+            try:
+                signed_txn = self.sign(build_txn(nonce))
+                if on_signed is not None:
+                    on_signed(self.web3.to_hex(signed_txn.hash))
+                tx_hash = self.web3.eth.send_raw_transaction(signed_txn.raw_transaction)
+            except Exception as e:
+                if signed_txn is not None and is_already_known(e):
+                    self.settle(nonce, sent=True)
+                    return signed_txn.hash
+                self.settle(nonce, sent=False)
+                if not is_nonce_error(e):
+                    raise
+                self.sync(force=True)
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                continue
+            self.settle(nonce, sent=True)
+            return tx_hash
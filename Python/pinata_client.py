@@ -0,0 +1,260 @@
+import asyncio
+import io
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+try:
+    import httpx
+except ImportError:  # only AsyncPinataClient needs it
+    httpx = None
+
+DEFAULT_UPLOAD_URL = "https://uploads.pinata.cloud/v3/files"
+DEFAULT_API_URL = "https://api.pinata.cloud"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PinataError(Exception):
+    """A Pinata request failed for good, or returned an unexpected body"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """Client-side rate limiter: `rate` requests per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # The balance may go negative; later callers queue up behind earlier ones
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait until a request may be sent without blocking the event loop"""
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def shared_limiter(jwt, requests_per_minute=60, burst=10):
+    """
+    The process-wide TokenBucket for one Pinata account. Pinata rate-limits per
+    key, so every client using `jwt` in this process (sync or async) draws from
+    the same bucket; the first caller's limits win.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(jwt)
+        if limiter is None:
+            limiter = _limiters[jwt] = TokenBucket(requests_per_minute / 60.0, burst)
+        return limiter
+
+
+def retry_delay(backoff, attempt, response=None, max_delay=30.0):
+    """
+    Seconds to wait before retry number `attempt`, preferring the server's
+    Retry-After. A Retry-After above `max_delay` (or unparseable) falls back to
+    the backoff schedule, which is capped at `max_delay` too, so one response
+    can't park a worker thread or outbox lease for an hour.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            pass
+        else:
+            if 0 <= delay <= max_delay:
+                return delay
+    return min(backoff * (2 ** attempt), max_delay)
+
+
+def _json_field(response, key, message):
+    body = response.json()
+    if not isinstance(body, dict) or key not in body:
+        raise PinataError(message)
+    return body[key]
+
+
+class PinataClient:
+    """
+    One shared keep-alive session for every Pinata call. Requests pass through
+    the account's token bucket (shared_limiter) sized to the plan's rate limit,
+    carry connect/read timeouts, and are retried with exponential backoff on
+    429 / 5xx (honouring Retry-After up to `max_backoff`) and on connection
+    errors. Base URLs are configurable so the client can be pointed at a local
+    stub server.
+    """
+
+    def __init__(self, jwt, upload_url=DEFAULT_UPLOAD_URL, api_url=DEFAULT_API_URL, json_url=None,
+                 requests_per_minute=60, burst=10, pool_size=16, timeout=(5, 60), retries=3, backoff=0.5,
+                 max_backoff=30.0, limiter=None):
+        self.upload_url = upload_url
+        self.api_url = api_url.rstrip("/")
+        self.json_url = json_url or f"{self.api_url}/pinning/pinJSONToIPFS"
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = limiter or shared_limiter(jwt, requests_per_minute, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {jwt}"
+
+    def request(self, method, url, make_kwargs=None, **kwargs):
+        """
+        Send one request with rate limiting and retries and return the response.
+        Streaming bodies can only be read once, so `make_kwargs` (if given) is
+        called on every attempt to build fresh request arguments.
+        """
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            request_kwargs = dict(kwargs, **(make_kwargs() if make_kwargs else {}))
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **request_kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise PinataError(f"Pinata request failed: {e}")
+                time.sleep(retry_delay(self.backoff, attempt, max_delay=self.max_backoff))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                time.sleep(retry_delay(self.backoff, attempt, response, self.max_backoff))
+                continue
+            if response.status_code != 200:
+                raise PinataError(f"Pinata request failed: {response.status_code} - {response.text}",
+                                  status_code=response.status_code)
+            return response
+
+    def upload_file(self, data, file_name, content_type="application/octet-stream", network="public"):
+        """Upload bytes through the v3 files API and return the response's data dict (cid, ...)"""
+        def make_kwargs():
+            m = MultipartEncoder(fields={
+                "file": (file_name, io.BytesIO(data), content_type),
+                "network": network
+            })
+            return {"data": m, "headers": {"Content-Type": m.content_type}}
+
+        response = self.request("POST", self.upload_url, make_kwargs=make_kwargs)
+        uploaded = _json_field(response, "data", message="Unexpected response format: 'cid' missing")
+        if "cid" not in uploaded:
+            raise PinataError("Unexpected response format: 'cid' missing")
+        return uploaded
+
+    def pin_file(self, data, file_name, content_type="application/octet-stream"):
+        """Pin bytes through the legacy pinFileToIPFS endpoint and return the IPFS hash"""
+        def make_kwargs():
+            m = MultipartEncoder(fields={"file": (file_name, io.BytesIO(data), content_type)})
+            return {"data": m, "headers": {"Content-Type": m.content_type}}
+
+        response = self.request("POST", f"{self.api_url}/pinning/pinFileToIPFS", make_kwargs=make_kwargs)
+        return _json_field(response, "IpfsHash", message="IpfsHash is not found in the Response")
+
+    def pin_json(self, content):
+        """Pin a JSON document and return its IPFS hash"""
+        response = self.request("POST", self.json_url, json=content)
+        return _json_field(response, "IpfsHash", message="IpfsHash is not found in the Response")
+
+
+class AsyncPinataClient:
+    """
+    PinataClient for asyncio code: the same endpoints, limits and retry policy
+    on a pooled httpx.AsyncClient, so an upload in flight only holds a socket,
+    never the event loop.
+    """
+
+    def __init__(self, jwt, upload_url=DEFAULT_UPLOAD_URL, api_url=DEFAULT_API_URL, json_url=None,
+                 requests_per_minute=60, burst=10, pool_size=16, timeout=(5, 60), retries=3, backoff=0.5,
+                 max_backoff=30.0, limiter=None):
+        self.upload_url = upload_url
+        self.api_url = api_url.rstrip("/")
+        self.json_url = json_url or f"{self.api_url}/pinning/pinJSONToIPFS"
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = limiter or shared_limiter(jwt, requests_per_minute, burst)
+
+        if httpx is None:
+            raise ImportError("AsyncPinataClient requires httpx (pip install httpx)")
+        connect_timeout, read_timeout = timeout
+        self.client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {jwt}"},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def request(self, method, url, **kwargs):
+        """Send one request with rate limiting and retries and return the response"""
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire_async()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise PinataError(f"Pinata request failed: {e}")
+                await asyncio.sleep(retry_delay(self.backoff, attempt, max_delay=self.max_backoff))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                await asyncio.sleep(retry_delay(self.backoff, attempt, response, self.max_backoff))
+                continue
+            if response.status_code != 200:
+                raise PinataError(f"Pinata request failed: {response.status_code} - {response.text}",
+                                  status_code=response.status_code)
+            return response
+
+    async def upload_file(self, data, file_name, content_type="application/octet-stream", network="public"):
+        """Upload bytes through the v3 files API and return the response's data dict (cid, ...)"""
+        response = await self.request(
+            "POST", self.upload_url,
+            files={"file": (file_name, data, content_type)},
+            data={"network": network}
+        )
+        uploaded = _json_field(response, "data", message="Unexpected response format: 'cid' missing")
+        if "cid" not in uploaded:
+            raise PinataError("Unexpected response format: 'cid' missing")
+        return uploaded
+
+    async def pin_file(self, data, file_name, content_type="application/octet-stream"):
+        """Pin bytes through the legacy pinFileToIPFS endpoint and return the IPFS hash"""
+        response = await self.request(
+            "POST", f"{self.api_url}/pinning/pinFileToIPFS",
+            files={"file": (file_name, data, content_type)}
+        )
+        return _json_field(response, "IpfsHash", message="IpfsHash is not found in the Response")
+
+    async def pin_json(self, content):
+        """Pin a JSON document and return its IPFS hash"""
+        response = await self.request("POST", self.json_url, json=content)
+        return _json_field(response, "IpfsHash", message="IpfsHash is not found in the Response")
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,131 @@
+import json
+import os
+import random
+import threading
+import time
+
+DEFAULT_TOPIC = "General"
+
+
+class _Bank:
+    """One immutable load of the questions file: questions in an array, indexes into it"""
+
+    __slots__ = ("questions", "positions", "topics")
+
+    def __init__(self, questions):
+        self.questions = []
+        self.positions = {}
+        self.topics = {}
+        for question in questions:
+            question_id = question["id"]
+            if question_id in self.positions:
+                raise ValueError(f"Duplicate quiz question id: {question_id}")
+            if not 0 <= question["correct_answer"] < len(question["options"]):
+                raise ValueError(f"Question {question_id}: correct_answer is not one of its options")
+            position = len(self.questions)
+            self.questions.append(question)
+            self.positions[question_id] = position
+            self.topics.setdefault(question.get("topic") or DEFAULT_TOPIC, []).append(position)
+
+
+class QuizBank:
+    """
+    Quiz questions loaded from a JSON array and interned once into an array
+    with id and topic indexes, so drawing k questions costs O(k) however large
+    the bank is and sessions only need to keep ids. The file is re-read when
+    its mtime changes (checked at most every `check_interval` seconds); a file
+    that fails to parse leaves the previous bank in place.
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._bank = None
+        self._reload()
+
+    def _reload(self):
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, "r") as f:
+            bank = _Bank(json.load(f))
+        self._bank, self._mtime = bank, mtime
+
+    def _current(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    try:
+                        mtime = os.stat(self.path).st_mtime
+                        if mtime != self._mtime:
+                            # Remember the mtime even if the load fails so a broken file is reported once
+                            self._mtime = mtime
+                            self._reload()
+                    except (OSError, ValueError, KeyError, TypeError) as e:
+                        print(f"Keeping the previous quiz bank, reload of {self.path} failed: {e}")
+        return self._bank
+
+    def __len__(self):
+        return len(self._current().questions)
+
+    def get(self, question_id):
+        """The question with this id, or None if it is no longer in the bank"""
+        bank = self._current()
+        position = bank.positions.get(question_id)
+        return bank.questions[position] if position is not None else None
+
+    def topics(self):
+        """Topic -> number of questions"""
+        return {topic: len(positions) for topic, positions in self._current().topics.items()}
+
+    def sample(self, k, topic_weights=None, stratified=False):
+        """
+        Ids of up to k distinct questions in random order. By default every
+        question is equally likely; `stratified` splits k across topics in
+        proportion to their size, and `topic_weights` ({topic: weight}) draws
+        each question's topic by weight instead. Topics without a weight are
+        left out.
+        """
+        bank = self._current()
+        k = min(k, len(bank.questions))
+        if topic_weights:
+            counts = self._weighted_counts(bank, k, topic_weights)
+        elif stratified:
+            counts = self._stratified_counts(bank, k)
+        else:
+            return [bank.questions[position]["id"] for position in random.sample(range(len(bank.questions)), k)]
+
+        picked = []
+        for topic, count in counts.items():
+            positions = bank.topics[topic]
+            picked.extend(positions[index] for index in random.sample(range(len(positions)), count))
+        random.shuffle(picked)
+        return [bank.questions[position]["id"] for position in picked]
+
+    @staticmethod
+    def _stratified_counts(bank, k):
+        # Largest-remainder apportionment of k over topic sizes
+        total = len(bank.questions)
+        shares = {topic: k * len(positions) / total for topic, positions in bank.topics.items()}
+        counts = {topic: int(share) for topic, share in shares.items()}
+        leftover = k - sum(counts.values())
+        for topic in sorted(shares, key=lambda topic: shares[topic] - counts[topic], reverse=True)[:leftover]:
+            counts[topic] += 1
+        return counts
+
+    @staticmethod
+    def _weighted_counts(bank, k, topic_weights):
+        available = {topic: len(bank.topics[topic]) for topic, weight in topic_weights.items()
+                     if weight > 0 and topic in bank.topics}
+        counts = dict.fromkeys(available, 0)
+        for _ in range(min(k, sum(available.values()))):
+            topics = list(available)
+            topic = random.choices(topics, weights=[topic_weights[topic] for topic in topics])[0]
+            counts[topic] += 1
+            if counts[topic] == available[topic]:
+                # Exhausted topics drop out so the draw never repeats a question
+                del available[topic]
+        return counts
@@ -0,0 +1,227 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+DEFAULT_TTL = 3600  # seconds a session survives without activity
+DEFAULT_MAX_SESSIONS = 50000
+SWEEP_EVERY = 100  # SQLite saves between expiry / size-cap sweeps
+
+
+class QuizSession:
+    """One quiz attempt. Only question ids are kept; the question text stays in the bank."""
+
+    __slots__ = ("session_id", "user_address", "question_ids", "current_question",
+                 "correct_answers", "started_at", "expires_at")
+
+    def __init__(self, session_id, user_address, question_ids, current_question=0,
+                 correct_answers=0, started_at=None, expires_at=0.0):
+        self.session_id = session_id
+        self.user_address = user_address
+        self.question_ids = tuple(question_ids)
+        self.current_question = current_question
+        self.correct_answers = correct_answers
+        self.started_at = started_at or time.time()
+        self.expires_at = expires_at
+
+    @classmethod
+    def new(cls, user_address, question_ids):
+        return cls(uuid.uuid4().hex, user_address, question_ids)
+
+    @property
+    def total_questions(self):
+        return len(self.question_ids)
+
+    @property
+    def completed(self):
+        return self.current_question >= len(self.question_ids)
+
+    @property
+    def current_question_id(self):
+        return None if self.completed else self.question_ids[self.current_question]
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def copy(self):
+        return QuizSession.from_dict(self.to_dict())
+
+
+class MemorySessionStore:
+    """
+    Per-process session store split into shards, each an OrderedDict with its own
+    lock, so concurrent requests rarely contend. Every save pushes the session's
+    expiry `ttl` seconds out; expired sessions are dropped when touched, and once
+    a shard is full its least recently saved session is evicted. Sessions are
+    copied in and out, so a caller's changes only land through save / save_if.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS, shards=16):
+        self.ttl = ttl
+        self._shard_capacity = max(1, max_sessions // shards)
+        self._shards = [(OrderedDict(), threading.Lock()) for _ in range(shards)]
+
+    def _shard(self, session_id):
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    def get(self, session_id):
+        sessions, lock = self._shard(session_id)
+        with lock:
+            session = sessions.get(session_id)
+            if session is None:
+                return None
+            if session.expires_at <= time.time():
+                del sessions[session_id]
+                return None
+            return session.copy()
+
+    def save(self, session):
+        sessions, lock = self._shard(session.session_id)
+        with lock:
+            self._put(sessions, session)
+
+    def save_if(self, session, expected_question):
+        """
+        Save `session` only if the stored copy is still live and at question
+        `expected_question`, so of two requests that read the same session only
+        one gets to record (and pay for) its answers. Returns whether it saved.
+        """
+        sessions, lock = self._shard(session.session_id)
+        with lock:
+            stored = sessions.get(session.session_id)
+            if (stored is None or stored.expires_at <= time.time()
+                    or stored.current_question != expected_question):
+                return False
+            self._put(sessions, session)
+            return True
+
+    def _put(self, sessions, session):
+        now = time.time()
+        session.expires_at = now + self.ttl
+        sessions[session.session_id] = session.copy()
+        sessions.move_to_end(session.session_id)
+        # Saves keep each shard ordered by expiry, so the stale ones are at the front
+        while sessions:
+            oldest_id, oldest = next(iter(sessions.items()))
+            if oldest.expires_at > now and len(sessions) <= self._shard_capacity:
+                break
+            del sessions[oldest_id]
+
+    def delete(self, session_id):
+        sessions, lock = self._shard(session_id)
+        with lock:
+            sessions.pop(session_id, None)
+
+    def count(self):
+        """Live sessions across all shards"""
+        now = time.time()
+        total = 0
+        for sessions, lock in self._shards:
+            with lock:
+                total += sum(1 for session in sessions.values() if session.expires_at > now)
+        return total
+
+
+class SqliteSessionStore:
+    """
+    Session store in a local SQLite database (WAL mode) so several API workers
+    on one host share quiz sessions. Same TTL and size cap as the memory store;
+    expired rows and any excess over the cap are swept every SWEEP_EVERY saves,
+    so the table can briefly hold up to that many sessions over the cap.
+    """
+
+    def __init__(self, db_path, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._saves = 0
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS quiz_sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_quiz_sessions_expiry ON quiz_sessions (expires_at);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        row = self._conn().execute(
+            "SELECT data FROM quiz_sessions WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time())
+        ).fetchone()
+        return QuizSession.from_dict(json.loads(row[0])) if row else None
+
+    def save(self, session):
+        now = time.time()
+        session.expires_at = now + self.ttl
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO quiz_sessions (session_id, data, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                (session.session_id, json.dumps(session.to_dict()), session.expires_at)
+            )
+            self._saves += 1
+            if self._saves % SWEEP_EVERY == 0:
+                self._sweep(conn, now)
+
+    def save_if(self, session, expected_question):
+        """Save only if the stored session is live and still at `expected_question`; see MemorySessionStore"""
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "UPDATE quiz_sessions SET data = ?, expires_at = ? "
+                "WHERE session_id = ? AND expires_at > ? AND json_extract(data, '$.current_question') = ?",
+                (json.dumps(dict(session.to_dict(), expires_at=expires_at)), expires_at,
+                 session.session_id, now, expected_question)
+            )
+        if cursor.rowcount != 1:
+            return False
+        session.expires_at = expires_at
+        return True
+
+    def _sweep(self, conn, now):
+        conn.execute("DELETE FROM quiz_sessions WHERE expires_at <= ?", (now,))
+        # Over the cap, the sessions closest to expiry (least recently used) go first
+        conn.execute(
+            "DELETE FROM quiz_sessions WHERE session_id IN ("
+            "SELECT session_id FROM quiz_sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def delete(self, session_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM quiz_sessions WHERE session_id = ?", (session_id,))
+
+    def count(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM quiz_sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+
+def create_session_store(backend="memory", db_path=None, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS):
+    """Use the memory backend for a single worker and sqlite to share sessions between workers on one host"""
+    if backend == "memory":
+        return MemorySessionStore(ttl=ttl, max_sessions=max_sessions)
+    if backend == "sqlite":
+        if not db_path:
+            raise ValueError("The sqlite session backend needs a db_path")
+        return SqliteSessionStore(db_path, ttl=ttl, max_sessions=max_sessions)
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -0,0 +1,68 @@
+import threading
+import time
+
+
+class TeamIndex:
+    """
+    In-memory team -> members view over the badge record store, so team lookups
+    are dictionary reads. It is built once at startup and then only pulls
+    records appended since the last refresh, whether by this worker or another.
+    Records still marked pending are held back until they are completed or removed.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._members = {}
+        self._last_id = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.refresh()
+
+    def refresh(self):
+        """Fold in records appended since the last refresh"""
+        with self._lock:
+            for record_id in list(self._pending):
+                record = self.store.get(record_id)
+                if record is None or record.get("status") != "pending":
+                    self._pending.discard(record_id)
+                    if record is not None:
+                        self._add(record)
+            for record in self.store.records_since(self._last_id):
+                if record.get("status") == "pending":
+                    self._pending.add(record["record_id"])
+                else:
+                    self._add(record)
+                self._last_id = record["record_id"]
+
+    def _add(self, record):
+        # "class_semester" doubles as the team name in badge records
+        team_name = record.get("class_semester") or "Unknown"
+        self._members.setdefault(team_name, []).append(record.get("student_name", "Unknown"))
+
+    def start(self, interval=5.0):
+        """Keep refreshing in the background to pick up other workers' records"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception:
+                    # A locked or briefly unavailable database is retried next interval
+                    pass
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=run, name="team-index", daemon=True)
+                self._thread.start()
+        return self
+
+    def teams(self):
+        with self._lock:
+            return list(self._members)
+
+    def members(self, team_name):
+        """Member names in the order their records arrived, or None for an unknown team"""
+        with self._lock:
+            members = self._members.get(team_name)
+            return list(members) if members is not None else None
@@ -0,0 +1,203 @@
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from mint_queue import CONFIRMED, FAILED, QUEUED, REVERTED, SENDING, SENT, MintJob, MintQueue
+
+ALICE = "0x" + "a1" * 20
+BOB = "0x" + "b2" * 20
+CAROL = "0x" + "c3" * 20
+
+
+class FakeChain:
+    """
+    web3, contract and signer in one: every transaction is mined the moment it
+    is sent, and reverts if any of its recipients is in `bad_recipients`.
+    """
+
+    def __init__(self, batch=False):
+        self.abi = [{"type": "function", "name": "mintBadge"}]
+        if batch:
+            self.abi.append({"type": "function", "name": "mintBadgeBatch"})
+        self.address = "0x" + "00" * 20
+        self.bad_recipients = set()
+        self.send_errors = []
+        self.sent = []
+        self.receipts = {}
+        self.nonce = 0
+        self.next_token_id = 1
+        self.eth = SimpleNamespace(get_transaction=self.get_transaction,
+                                   get_transaction_receipt=self.get_transaction_receipt)
+        self.functions = SimpleNamespace(
+            mintBadge=lambda recipient, badge, uri: self.call([recipient]),
+            mintBadgeBatch=lambda recipients, badges, uris: self.call(recipients)
+        )
+        self.events = SimpleNamespace(BadgeMinted=lambda: SimpleNamespace(
+            process_receipt=lambda receipt, errors=None: [{"args": {"tokenId": t}} for t in receipt["token_ids"]]
+        ))
+
+    to_hex = staticmethod(Web3.to_hex)
+    to_wei = staticmethod(Web3.to_wei)
+
+    @staticmethod
+    def call(recipients):
+        return SimpleNamespace(build_transaction=lambda params: dict(params, recipients=list(recipients)))
+
+    def send_transaction(self, build_txn, on_signed=None):
+        txn = build_txn(self.nonce)
+        tx_hash = Web3.to_hex(self.nonce + 1).ljust(66, "0")
+        self.nonce += 1
+        on_signed(tx_hash)
+        error, reached_node = self.send_errors.pop(0) if self.send_errors else (None, True)
+        if reached_node:
+            self.sent.append(txn["recipients"])
+            if self.bad_recipients & set(txn["recipients"]):
+                self.receipts[tx_hash] = {"status": 0, "token_ids": []}
+            else:
+                token_ids = list(range(self.next_token_id, self.next_token_id + len(txn["recipients"])))
+                self.next_token_id += len(token_ids)
+                self.receipts[tx_hash] = {"status": 1, "token_ids": token_ids}
+        if error is not None:
+            raise error
+        return HexBytes(tx_hash)
+
+    def get_transaction(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return {"hash": tx_hash}
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+
+def make_queue(chain, db_path, refunds, **kwargs):
+    return MintQueue(chain, chain, chain, str(db_path),
+                     refund=lambda user, tokens, key: refunds.append((user, tokens, key)),
+                     poll_interval=0.01, idle_interval=0.05, **kwargs)
+
+
+def insert_jobs(db_path, jobs, claimed_until=None):
+    """Write jobs straight into the table, as a worker that crashed would have left them"""
+    with sqlite3.connect(db_path) as conn:
+        for job in jobs:
+            conn.execute(
+                f"INSERT INTO mint_jobs ({', '.join(MintJob.FIELDS)}, claimed_until) "
+                f"VALUES ({', '.join('?' * (len(MintJob.FIELDS) + 1))})",
+                tuple(getattr(job, field) for field in MintJob.FIELDS) + (claimed_until,)
+            )
+
+
+def wait_for(queue, job_ids, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jobs = [queue.get(job_id) for job_id in job_ids]
+        if all(job["status"] in (CONFIRMED, REVERTED, FAILED) for job in jobs):
+            return jobs
+        time.sleep(0.01)
+    pytest.fail(f"Jobs did not finish: {jobs}")
+
+
+def test_single_mint_is_confirmed_without_refund(tmp_path):
+    chain, refunds = FakeChain(), []
+    queue = make_queue(chain, tmp_path / "jobs.db", refunds)
+
+    [job] = wait_for(queue, [queue.submit(ALICE, "Newbie", "ipfs://a", ALICE, 10).job_id])
+    assert job["status"] == CONFIRMED
+    assert job["token_id"] == 1
+    assert refunds == []
+
+
+def test_jobs_in_one_window_share_a_batch(tmp_path):
+    chain, refunds = FakeChain(batch=True), []
+    queue = make_queue(chain, tmp_path / "jobs.db", refunds, batch_window=0.2)
+
+    job_ids = [queue.submit(address, "Newbie", "ipfs://x", address, 10).job_id for address in (ALICE, BOB, CAROL)]
+    jobs = wait_for(queue, job_ids)
+    assert chain.sent == [[Web3.to_checksum_address(a) for a in (ALICE, BOB, CAROL)]]
+    assert [job["token_id"] for job in jobs] == [1, 2, 3]
+
+
+def test_reverted_batch_is_retried_alone_and_refunds_once(tmp_path):
+    chain, refunds = FakeChain(batch=True), []
+    chain.bad_recipients.add(Web3.to_checksum_address(BOB))
+    queue = make_queue(chain, tmp_path / "jobs.db", refunds, batch_window=0.2)
+
+    job_ids = [queue.submit(address, "Newbie", "ipfs://x", address, 10, request_key=f"mint:{address}").job_id
+               for address in (ALICE, BOB, CAROL)]
+    statuses = [job["status"] for job in wait_for(queue, job_ids)]
+    assert statuses == [CONFIRMED, REVERTED, CONFIRMED]
+    assert len(chain.sent) == 4
+    assert refunds == [(BOB, 10, f"mint:{BOB}")]
+
+
+def test_definite_send_failure_refunds_once(tmp_path):
+    chain, refunds = FakeChain(), []
+    chain.send_errors.append((ValueError("insufficient funds for gas"), False))
+    queue = make_queue(chain, tmp_path / "jobs.db", refunds)
+
+    [job] = wait_for(queue, [queue.submit(ALICE, "Pro", "ipfs://a", ALICE, 75, request_key="k").job_id])
+    assert job["status"] == FAILED
+    assert job["tokens_refunded"] == 75
+    time.sleep(0.1)
+    assert refunds == [(ALICE, 75, "k")]
+
+
+def test_timeout_after_the_node_took_the_send_is_not_refunded(tmp_path):
+    chain, refunds = FakeChain(), []
+    chain.send_errors.append((requests.Timeout("read timed out"), True))
+    queue = make_queue(chain, tmp_path / "jobs.db", refunds)
+
+    [job] = wait_for(queue, [queue.submit(ALICE, "Pro", "ipfs://a", ALICE, 75).job_id])
+    assert job["status"] == CONFIRMED
+    assert refunds == []
+
+
+def test_expired_leases_resume_after_a_crash(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    chain, refunds = FakeChain(), []
+    # Creates the table; never started, so nothing is sent by it
+    make_queue(chain, db_path, refunds)
+
+    # One job died before signing, one after its transaction reached the node
+    unsigned = MintJob(ALICE, "Newbie", "ipfs://a", ALICE, 10)
+    signed = MintJob(BOB, "Newbie", "ipfs://b", BOB, 10)
+    chain.send_transaction(lambda nonce: {"recipients": [BOB]}, on_signed=lambda tx_hash: None)
+    signed.tx_hash, signed.batch_index = next(iter(chain.receipts)), 0
+    unsigned.status = signed.status = SENDING
+    insert_jobs(db_path, [unsigned, signed], claimed_until=time.time() - 1)
+
+    queue = make_queue(chain, db_path, refunds).start()
+    jobs = wait_for(queue, [unsigned.job_id, signed.job_id])
+    assert [job["status"] for job in jobs] == [CONFIRMED, CONFIRMED]
+    # The signed job was tracked, not sent a second time
+    assert chain.sent == [[BOB], [Web3.to_checksum_address(ALICE)]]
+    assert refunds == []
+
+
+def test_two_workers_failing_one_job_refund_once(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    refunds = []
+    queue = make_queue(FakeChain(), db_path, refunds)
+    job = MintJob(ALICE, "Pro", "ipfs://a", ALICE, 75, request_key="k")
+    job.status = SENT
+    insert_jobs(db_path, [job])
+
+    queue._fail([job], FAILED, "Transaction was never mined")
+    queue._fail([job], FAILED, "Transaction was never mined")
+    assert refunds == [(ALICE, 75, "k")]
+
+
+def test_status_hides_the_internal_sending_state(tmp_path):
+    job = MintJob(ALICE, "Newbie", "ipfs://a", ALICE, 10)
+    job.status = SENDING
+    assert job.to_dict()["status"] == QUEUED
+    job.status = SENT
+    assert job.to_dict()["status"] == SENT
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+from nonce_manager import NonceManager
+
+
+class FakeNode:
+    """Just enough of web3 for NonceManager: a pending count and scripted send errors"""
+
+    def __init__(self, pending=0):
+        self.pending = pending
+        self.errors = []
+        self.sent = []
+        self.eth = SimpleNamespace(
+            get_transaction_count=lambda address, block: self.pending,
+            send_raw_transaction=self.send_raw_transaction,
+            account=SimpleNamespace(sign_transaction=self.sign_transaction)
+        )
+
+    @staticmethod
+    def to_hex(value):
+        return "0x" + value.hex()
+
+    @staticmethod
+    def sign_transaction(txn, private_key):
+        digest = txn["nonce"].to_bytes(32, "big")
+        return SimpleNamespace(hash=digest, raw_transaction=digest)
+
+    def send_raw_transaction(self, raw):
+        if self.errors:
+            raise ValueError(self.errors.pop(0))
+        self.sent.append(int.from_bytes(raw, "big"))
+        self.pending += 1
+        return raw
+
+
+def build(nonce):
+    return {"nonce": nonce}
+
+
+def test_unsent_last_nonce_is_reused():
+    node = FakeNode(pending=7)
+    nonces = NonceManager(node, "0xabc", "key")
+
+    assert nonces.reserve(2) == [7, 8]
+    nonces.settle(8, sent=False)
+    nonces.settle(7, sent=True)
+    assert nonces.next_nonce() == 8
+
+
+def test_forced_sync_never_reissues_outstanding_nonces():
+    node = FakeNode(pending=0)
+    nonces = NonceManager(node, "0xabc", "key")
+    assert nonces.reserve(3) == [0, 1, 2]
+
+    node.pending = 1
+    nonces.sync(force=True)
+    assert nonces.next_nonce() == 3
+
+    node.pending = 10
+    nonces.sync(force=True)
+    assert nonces.next_nonce() == 10
+
+
+def test_already_known_counts_as_sent():
+    node = FakeNode(pending=4)
+    nonces = NonceManager(node, "0xabc", "key")
+    node.errors.append("already known")
+
+    tx_hash = nonces.send_transaction(build)
+    assert int.from_bytes(tx_hash, "big") == 4
+    assert nonces.next_nonce() == 5
+
+
+def test_nonce_error_resyncs_and_retries():
+    node = FakeNode(pending=0)
+    nonces = NonceManager(node, "0xabc", "key")
+    assert nonces.next_nonce() == 0
+    nonces.settle(0, sent=True)
+
+    # Another sender used nonces 1 and 2 behind our back
+    node.pending = 3
+    node.errors.append("nonce too low")
+    nonces.send_transaction(build)
+    assert node.sent == [3]
+
+
+def test_failed_build_gives_the_nonce_back():
+    nonces = NonceManager(FakeNode(pending=2), "0xabc", "key")
+
+    def broken(nonce):
+        raise RuntimeError("bad input")
+
+    with pytest.raises(RuntimeError):
+        nonces.send_transaction(broken)
+    assert nonces.next_nonce() == 2
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pinata_client import AsyncPinataClient, PinataClient, PinataError, TokenBucket, retry_delay
+
+
+class StubPinata(BaseHTTPRequestHandler):
+    """Plays back `server.responses` in order and records every request it gets"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.received.append((self.path, self.headers.get("Content-Type", ""), body))
+        status, headers, payload = self.server.responses.pop(0)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPinata)
+    server.responses = []
+    server.received = []
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client_for(stub, **kwargs):
+    return PinataClient(
+        "jwt", upload_url=f"{stub.url}/v3/files", api_url=stub.url,
+        backoff=0, limiter=TokenBucket(1000, 1000), **kwargs
+    )
+
+
+def test_upload_retries_5xx_and_replays_the_multipart_body(stub):
+    stub.responses = [
+        (503, {}, {"error": "busy"}),
+        (429, {}, {"error": "slow down"}),
+        (200, {}, {"data": {"cid": "bafy"}}),
+    ]
+
+    assert client_for(stub).upload_file(b"\x89PNG certificate", "cert.png")["cid"] == "bafy"
+    assert len(stub.received) == 3
+    # Each attempt builds a fresh encoder with its own boundary; the parts must match
+    bodies = {
+        body.replace(content_type.split("boundary=")[1].encode(), b"BOUNDARY")
+        for _, content_type, body in stub.received
+    }
+    assert len(bodies) == 1
+    assert b"\x89PNG certificate" in bodies.pop()
+
+
+def test_gives_up_after_the_retry_budget(stub):
+    stub.responses = [(500, {}, {"error": "down"})] * 3
+
+    with pytest.raises(PinataError) as excinfo:
+        client_for(stub, retries=2).pin_json({"name": "badge"})
+    assert excinfo.value.status_code == 500
+    assert len(stub.received) == 3
+
+
+def test_long_retry_after_is_clamped(stub):
+    stub.responses = [
+        (429, {"Retry-After": "3600"}, {"error": "slow down"}),
+        (200, {}, {"IpfsHash": "Qm1"}),
+    ]
+
+    started = time.monotonic()
+    assert client_for(stub, max_backoff=0.05).pin_json({"name": "badge"}) == "Qm1"
+    assert time.monotonic() - started < 5
+
+
+def test_retry_delay_honours_short_retry_after():
+    class Response:
+        headers = {"Retry-After": "2"}
+
+    assert retry_delay(0.5, 0, Response()) == 2.0
+    Response.headers = {"Retry-After": "3600"}
+    assert retry_delay(0.5, 1, Response(), max_delay=30) == 1.0
+    assert retry_delay(10, 5, max_delay=30) == 30
+
+
+def test_async_client_retries_against_the_stub(stub):
+    stub.responses = [
+        (502, {}, {"error": "bad gateway"}),
+        (200, {}, {"IpfsHash": "Qm2"}),
+    ]
+
+    async def pin():
+        client = AsyncPinataClient("jwt", api_url=stub.url, backoff=0, limiter=TokenBucket(1000, 1000))
+        try:
+            return await client.pin_json({"name": "badge"})
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(pin()) == "Qm2"
+    assert len(stub.received) == 2
+
+
+def test_clients_on_one_key_share_a_limiter():
+    sync_client = PinataClient("shared-jwt")
+    async_client = AsyncPinataClient("shared-jwt")
+
+    assert sync_client.limiter is async_client.limiter
+    assert PinataClient("other-jwt").limiter is not sync_client.limiter
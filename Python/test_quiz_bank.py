@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+from quiz_bank import QuizBank
+
+
+def question(question_id, topic):
+    return {"id": question_id, "question": f"Q{question_id}", "options": ["a", "b"], "correct_answer": 1, "topic": topic}
+
+
+@pytest.fixture
+def bank_file(tmp_path):
+    path = tmp_path / "questions.json"
+    path.write_text(json.dumps(
+        [question(i, "Patents") for i in range(1, 7)] + [question(i, "Trademarks") for i in range(7, 10)]
+    ))
+    return path
+
+
+def test_sample_draws_distinct_known_ids(bank_file):
+    bank = QuizBank(str(bank_file))
+
+    ids = bank.sample(5)
+    assert len(set(ids)) == 5
+    assert all(bank.get(question_id) is not None for question_id in ids)
+    assert sorted(bank.sample(50)) == list(range(1, 10))
+
+
+def test_stratified_sample_follows_topic_sizes(bank_file):
+    bank = QuizBank(str(bank_file))
+
+    for _ in range(20):
+        topics = [bank.get(question_id)["topic"] for question_id in bank.sample(3, stratified=True)]
+        assert sorted(topics) == ["Patents", "Patents", "Trademarks"]
+
+
+def test_weighted_sample_skips_unweighted_topics_and_never_repeats(bank_file):
+    bank = QuizBank(str(bank_file))
+
+    ids = bank.sample(5, topic_weights={"Trademarks": 1})
+    assert sorted(ids) == [7, 8, 9]
+    ids = bank.sample(9, topic_weights={"Trademarks": 100, "Patents": 1})
+    assert sorted(ids) == list(range(1, 10))
+
+
+def test_reload_picks_up_edits_and_keeps_the_bank_on_a_broken_file(bank_file):
+    bank = QuizBank(str(bank_file), check_interval=0)
+    assert len(bank) == 9
+
+    bank_file.write_text(json.dumps([question(1, "Patents")]))
+    os.utime(bank_file, (1, 1))
+    assert len(bank) == 1
+    assert bank.get(2) is None
+
+    bank_file.write_text("[{")
+    os.utime(bank_file, (2, 2))
+    assert len(bank) == 1
+
+
+def test_bad_questions_are_rejected(tmp_path):
+    path = tmp_path / "questions.json"
+    path.write_text(json.dumps([question(1, "Patents"), question(1, "Patents")]))
+    with pytest.raises(ValueError):
+        QuizBank(str(path))
+
+    path.write_text(json.dumps([dict(question(1, "Patents"), correct_answer=2)]))
+    with pytest.raises(ValueError):
+        QuizBank(str(path))
+
+
+def test_shipped_questions_load():
+    bank = QuizBank(os.path.join(os.path.dirname(os.path.abspath(__file__)), "quiz_questions.json"))
+    assert len(bank) >= 5
+    assert len(set(bank.sample(5))) == 5
@@ -0,0 +1,74 @@
+import pytest
+
+from quiz_sessions import MemorySessionStore, QuizSession, SqliteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore()
+    return SqliteSessionStore(str(tmp_path / "sessions.db"))
+
+
+def test_only_one_concurrent_completion_is_saved(store):
+    session = QuizSession.new("alice", [1, 2, 3])
+    store.save(session)
+
+    first = store.get(session.session_id)
+    second = store.get(session.session_id)
+    for copy in (first, second):
+        copy.correct_answers = 3
+        copy.current_question = copy.total_questions
+
+    assert store.save_if(first, 0) is True
+    assert store.save_if(second, 0) is False
+    assert store.get(session.session_id).completed
+
+
+def test_save_if_rejects_missing_session(store):
+    assert store.save_if(QuizSession.new("alice", [1]), 0) is False
+
+
+def test_changes_only_land_through_save(store):
+    session = QuizSession.new("alice", [1, 2])
+    store.save(session)
+
+    store.get(session.session_id).current_question = 2
+    assert store.get(session.session_id).current_question == 0
+
+
+def test_expired_sessions_are_gone(tmp_path):
+    for store in (MemorySessionStore(ttl=-1), SqliteSessionStore(str(tmp_path / "sessions.db"), ttl=-1)):
+        session = QuizSession.new("alice", [1])
+        store.save(session)
+        assert store.get(session.session_id) is None
+        assert store.count() == 0
+
+
+def test_memory_store_evicts_least_recently_saved():
+    store = MemorySessionStore(max_sessions=2, shards=1)
+    first, second, third = (QuizSession.new("alice", [1]) for _ in range(3))
+    store.save(first)
+    store.save(second)
+    store.save(first)
+    store.save(third)
+
+    assert store.get(second.session_id) is None
+    assert store.get(first.session_id) is not None
+    assert store.count() == 2
+
+
+def test_sqlite_store_sweeps_to_the_cap_every_few_saves(tmp_path, monkeypatch):
+    monkeypatch.setattr("quiz_sessions.SWEEP_EVERY", 5)
+    store = SqliteSessionStore(str(tmp_path / "sessions.db"), max_sessions=3)
+    sessions = [QuizSession.new("alice", [1]) for _ in range(5)]
+
+    for session in sessions[:4]:
+        store.save(session)
+    # Between sweeps the cap may be overshot
+    assert store.count() == 4
+
+    store.save(sessions[4])
+    assert store.count() == 3
+    assert store.get(sessions[0].session_id) is None
+    assert store.get(sessions[4].session_id) is not None
@@ -0,0 +1,47 @@
+from token_ledger import TokenLedger
+
+
+def test_keyed_debit_replays_without_moving_balance(tmp_path):
+    ledger = TokenLedger(str(tmp_path / "ledger.db"))
+    ledger.credit("alice", 10)
+
+    assert ledger.debit("alice", 5, request_key="k") is True
+    assert ledger.debit("alice", 5, request_key="k") is True
+    assert ledger.get("alice") == 5
+
+
+def test_refund_makes_a_retried_debit_pay_again(tmp_path):
+    ledger = TokenLedger(str(tmp_path / "ledger.db"))
+    ledger.credit("alice", 5)
+
+    assert ledger.claim_request("k") == (True, None)
+    assert ledger.debit("alice", 5, request_key="k") is True
+    ledger.refund("alice", 5, request_key="k")
+    ledger.release_request("k")
+    assert ledger.get("alice") == 5
+
+    # The retry under the same key is charged, not handed the old result
+    assert ledger.claim_request("k") == (True, None)
+    assert ledger.debit("alice", 5, request_key="k") is True
+    assert ledger.get("alice") == 0
+    assert ledger.debit("alice", 5, request_key="k") is True
+    assert ledger.get("alice") == 0
+
+
+def test_finished_request_replays_response(tmp_path):
+    ledger = TokenLedger(str(tmp_path / "ledger.db"))
+
+    assert ledger.claim_request("k") == (True, None)
+    assert ledger.claim_request("k") == (False, None)
+    ledger.finish_request("k", {"status": 200, "body": {"ok": True}})
+    assert ledger.claim_request("k") == (False, {"status": 200, "body": {"ok": True}})
+
+
+def test_ledger_with_fewer_tiers_keeps_tier_counts(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    ledger = TokenLedger(path, tiers=[10, 30])
+    ledger.credit("alice", 40)
+
+    TokenLedger(path)
+    ledger.credit("bob", 15)
+    assert ledger.stats()["tier_counts"] == {10: 2, 30: 1}
@@ -0,0 +1,128 @@
+import asyncio
+import os
+
+from upload_outbox import COMPLETE, FAILED, PENDING, UploadOutbox
+
+PNG = b"\x89PNG certificate"
+
+
+class Pinata:
+    """Records pins and fails the next `failures[step]` calls of each step"""
+
+    def __init__(self, **failures):
+        self.failures = failures
+        self.images = []
+        self.metadata = []
+        self.completed = []
+        self.failed = []
+
+    def _maybe_fail(self, step):
+        if self.failures.get(step):
+            self.failures[step] -= 1
+            raise ConnectionError(f"{step} failed")
+
+    def pin_image(self, png_bytes, file_name):
+        self._maybe_fail("image")
+        self.images.append((png_bytes, file_name))
+        return f"image-{len(self.images)}"
+
+    def pin_metadata(self, metadata):
+        self._maybe_fail("metadata")
+        self.metadata.append(metadata)
+        return f"metadata-{len(self.metadata)}"
+
+    def outbox(self, tmp_path, **kwargs):
+        return UploadOutbox(
+            str(tmp_path / "outbox.db"), str(tmp_path / "blobs"),
+            pin_image=self.pin_image,
+            pin_metadata=self.pin_metadata,
+            build_metadata=lambda template, image_cid: dict(template, image=image_cid),
+            on_complete=self.completed.append,
+            on_failed=self.failed.append,
+            backoff=0, **kwargs
+        )
+
+
+def blobs(tmp_path):
+    return os.listdir(tmp_path / "blobs")
+
+
+def test_failed_metadata_pin_resumes_without_reuploading_the_image(tmp_path):
+    pinata = Pinata(metadata=1)
+    outbox = pinata.outbox(tmp_path)
+    task_id = outbox.enqueue(PNG, "cert.png", {"name": "Badge"}, record_id=7)
+
+    task = outbox.process(task_id)
+    assert task["status"] == PENDING
+    assert task["image_cid"] == "image-1"
+    assert task["attempts"] == 1
+    assert len(blobs(tmp_path)) == 1
+
+    task = outbox.process(task_id)
+    assert task["status"] == COMPLETE
+    assert task["metadata_cid"] == "metadata-1"
+    assert len(pinata.images) == 1
+    assert pinata.metadata == [{"name": "Badge", "image": "image-1"}]
+    assert [t["record_id"] for t in pinata.completed] == [7]
+    assert blobs(tmp_path) == []
+
+
+def test_identical_images_are_pinned_once(tmp_path):
+    pinata = Pinata()
+    outbox = pinata.outbox(tmp_path)
+
+    first = outbox.process(outbox.enqueue(PNG, "a.png", {"name": "A"}))
+    second = outbox.process(outbox.enqueue(PNG, "b.png", {"name": "B"}))
+    assert first["image_cid"] == second["image_cid"] == "image-1"
+    assert len(pinata.images) == 1
+    assert len(pinata.metadata) == 2
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    pinata = Pinata(image=5)
+    outbox = pinata.outbox(tmp_path, max_attempts=2)
+    task_id = outbox.enqueue(PNG, "cert.png", {"name": "Badge"})
+
+    outbox.process(task_id)
+    task = outbox.process(task_id)
+    assert task["status"] == FAILED
+    assert task["last_error"] == "image failed"
+    assert [t["task_id"] for t in pinata.failed] == [task_id]
+    assert blobs(tmp_path) == []
+    # A finished task is left alone
+    assert outbox.process(task_id)["attempts"] == 2
+
+
+def test_drainer_waits_out_the_lease_and_skips_held_tasks(tmp_path):
+    pinata = Pinata(image=1)
+    outbox = pinata.outbox(tmp_path, lease=60)
+    task_id = outbox.enqueue(PNG, "cert.png", {"name": "Badge"})
+
+    # The request thread gets the first go
+    assert outbox.due() == []
+    outbox.process(task_id)
+    assert outbox.due() == [task_id]
+
+    # Held by another worker: nothing is pinned
+    assert outbox._claim(task_id) is not None
+    assert outbox.process(task_id)["status"] == PENDING
+    assert pinata.images == []
+
+
+def test_async_processing_resumes_the_same_way(tmp_path):
+    pinata = Pinata(metadata=1)
+
+    async def pin_image(png_bytes, file_name):
+        return pinata.pin_image(png_bytes, file_name)
+
+    async def pin_metadata(metadata):
+        return pinata.pin_metadata(metadata)
+
+    outbox = pinata.outbox(tmp_path)
+    outbox.pin_image, outbox.pin_metadata = pin_image, pin_metadata
+    task_id = outbox.enqueue(PNG, "cert.png", {"name": "Badge"})
+
+    assert asyncio.run(outbox.process_async(task_id))["status"] == PENDING
+    assert asyncio.run(outbox.process_async(task_id))["status"] == COMPLETE
+    assert len(pinata.images) == 1
+    assert len(pinata.completed) == 1
@@ -0,0 +1,309 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_REQUEST_TTL = 86400  # seconds a finished request keeps replaying its response
+DEFAULT_MAX_REQUESTS = 100000
+DEFAULT_REQUEST_LEASE = 60  # seconds before an unfinished request may be taken over by a retry
+
+
+class TokenLedger:
+    """
+    Quiz token balances in an embedded SQLite database (WAL mode), safe to share
+    between worker processes. Every change to a balance is appended to
+    ledger_log in the same transaction, so the log always replays to the
+    current balances.
+
+    Running totals and, for each threshold in `tiers`, the number of users at or
+    above it are kept in ledger_stats / tier_counts and adjusted on every write,
+    so stats() never scans the balances.
+
+    Every mutation takes an optional `request_key` (an idempotency key). Its
+    result is stored in ledger_requests in the same transaction as the balance
+    change, and a later call with the same key returns that result without
+    touching the balance. claim_request() / finish_request() keep the whole
+    API response under the key as well, so a retried request is answered from
+    the table. Keys expire after `request_ttl` seconds and at most
+    `max_requests` are kept, oldest dropped first.
+    """
+
+    def __init__(self, db_path, tiers=(), request_ttl=DEFAULT_REQUEST_TTL, max_requests=DEFAULT_MAX_REQUESTS):
+        self.db_path = db_path
+        self.tiers = sorted(set(tiers))
+        self.request_ttl = request_ttl
+        self.max_requests = max_requests
+        self._claims = 0
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS balances (
+                user_address TEXT PRIMARY KEY,
+                tokens INTEGER NOT NULL CHECK (tokens >= 0)
+            );
+            CREATE TABLE IF NOT EXISTS ledger_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_address TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                delta INTEGER NOT NULL,
+                balance_after INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ledger_log_user ON ledger_log (user_address);
+            CREATE TABLE IF NOT EXISTS ledger_stats (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tier_counts (
+                threshold INTEGER PRIMARY KEY,
+                users INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ledger_requests (
+                request_key TEXT PRIMARY KEY,
+                result TEXT,
+                response TEXT,
+                claimed_until REAL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ledger_requests_created ON ledger_requests (created_at);
+        """)
+        self._write(self._prepare_stats)
+
+    def _prepare_stats(self, conn):
+        # Aggregates are rebuilt with one full scan only when they are missing or a tier is new.
+        # Thresholds another process counts are kept, so a ledger opened with fewer tiers never drops them.
+        stored = [row[0] for row in conn.execute("SELECT threshold FROM tier_counts ORDER BY threshold")]
+        self.tiers = sorted(set(self.tiers) | set(stored))
+        has_totals = conn.execute("SELECT COUNT(*) FROM ledger_stats").fetchone()[0] == 2
+        if has_totals and stored == self.tiers:
+            return
+        users, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM balances").fetchone()
+        conn.execute("DELETE FROM ledger_stats")
+        conn.executemany(
+            "INSERT INTO ledger_stats (key, value) VALUES (?, ?)",
+            [("total_users", users), ("total_tokens", total)]
+        )
+        conn.execute("DELETE FROM tier_counts")
+        for threshold in self.tiers:
+            count = conn.execute("SELECT COUNT(*) FROM balances WHERE tokens >= ?", (threshold,)).fetchone()[0]
+            conn.execute("INSERT INTO tier_counts (threshold, users) VALUES (?, ?)", (threshold, count))
+
+    def _track(self, conn, old_balance, new_balance):
+        """Fold one balance change into the running aggregates"""
+        if old_balance is None:
+            conn.execute("UPDATE ledger_stats SET value = value + 1 WHERE key = 'total_users'")
+        conn.execute(
+            "UPDATE ledger_stats SET value = value + ? WHERE key = 'total_tokens'",
+            (new_balance - (old_balance or 0),)
+        )
+        for threshold in self.tiers:
+            was_eligible = old_balance is not None and old_balance >= threshold
+            is_eligible = new_balance >= threshold
+            if was_eligible != is_eligible:
+                conn.execute(
+                    "UPDATE tier_counts SET users = users + ? WHERE threshold = ?",
+                    (1 if is_eligible else -1, threshold)
+                )
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads, so each thread keeps its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, apply, request_key=None):
+        """
+        Run `apply(conn)` inside one write transaction and return its result.
+        With a `request_key` that already has a result, that result is returned
+        and `apply` is not run.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if request_key is None:
+                result = apply(conn)
+            else:
+                row = conn.execute(
+                    "SELECT result FROM ledger_requests WHERE request_key = ?", (request_key,)
+                ).fetchone()
+                if row and row[0] is not None:
+                    result = json.loads(row[0])
+                else:
+                    result = apply(conn)
+                    conn.execute(
+                        "INSERT INTO ledger_requests (request_key, result, created_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(request_key) DO UPDATE SET result = excluded.result",
+                        (request_key, json.dumps(result), time.time())
+                    )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _log(conn, user_address, kind, delta, balance_after):
+        conn.execute(
+            "INSERT INTO ledger_log (user_address, kind, delta, balance_after, created_at) VALUES (?, ?, ?, ?, ?)",
+            (user_address, kind, delta, balance_after, datetime.now().isoformat())
+        )
+
+    @staticmethod
+    def _balance(conn, user_address):
+        row = conn.execute("SELECT tokens FROM balances WHERE user_address = ?", (user_address,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, user_address):
+        balance = self._balance(self._conn(), user_address)
+        return balance if balance is not None else 0
+
+    def initialize(self, user_address, initial_tokens, request_key=None):
+        """Create the account with `initial_tokens` unless it already exists; return the balance"""
+        def apply(conn):
+            balance = self._balance(conn, user_address)
+            if balance is not None:
+                return balance
+            conn.execute("INSERT INTO balances (user_address, tokens) VALUES (?, ?)", (user_address, initial_tokens))
+            self._log(conn, user_address, "init", initial_tokens, initial_tokens)
+            self._track(conn, None, initial_tokens)
+            return initial_tokens
+        return self._write(apply, request_key)
+
+    def _add(self, conn, user_address, amount, kind):
+        old_balance = self._balance(conn, user_address)
+        balance = (old_balance or 0) + amount
+        conn.execute(
+            "INSERT INTO balances (user_address, tokens) VALUES (?, ?) "
+            "ON CONFLICT(user_address) DO UPDATE SET tokens = excluded.tokens",
+            (user_address, balance)
+        )
+        self._log(conn, user_address, kind, amount, balance)
+        self._track(conn, old_balance, balance)
+        return balance
+
+    def credit(self, user_address, amount, request_key=None):
+        """Add tokens, creating the account if needed; return the new balance"""
+        return self._write(lambda conn: self._add(conn, user_address, amount, "credit"), request_key)
+
+    def refund(self, user_address, amount, request_key=None):
+        """
+        Give back tokens taken by a debit that did not go through. The debit's
+        `request_key` loses its stored result in the same transaction, so a
+        retry under that key is charged again rather than replaying the debit.
+        """
+        def apply(conn):
+            if request_key is not None:
+                conn.execute("UPDATE ledger_requests SET result = NULL WHERE request_key = ?", (request_key,))
+            return self._add(conn, user_address, amount, "refund")
+        return self._write(apply)
+
+    def debit(self, user_address, amount, request_key=None):
+        """Check-and-decrement in one transaction; False if the balance is too low"""
+        def apply(conn):
+            balance = self._balance(conn, user_address)
+            if balance is None or balance < amount:
+                return False
+            conn.execute("UPDATE balances SET tokens = ? WHERE user_address = ?", (balance - amount, user_address))
+            self._log(conn, user_address, "debit", -amount, balance - amount)
+            self._track(conn, balance, balance - amount)
+            return True
+        return self._write(apply, request_key)
+
+    def set_balance(self, user_address, amount, request_key=None):
+        def apply(conn):
+            old_balance = self._balance(conn, user_address)
+            conn.execute(
+                "INSERT INTO balances (user_address, tokens) VALUES (?, ?) "
+                "ON CONFLICT(user_address) DO UPDATE SET tokens = excluded.tokens",
+                (user_address, amount)
+            )
+            self._log(conn, user_address, "set", amount - (old_balance or 0), amount)
+            self._track(conn, old_balance, amount)
+            return amount
+        return self._write(apply, request_key)
+
+    def _prune_requests(self, conn, now):
+        conn.execute("DELETE FROM ledger_requests WHERE created_at < ?", (now - self.request_ttl,))
+        conn.execute(
+            "DELETE FROM ledger_requests WHERE request_key IN ("
+            "SELECT request_key FROM ledger_requests ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_requests,)
+        )
+
+    def claim_request(self, request_key, lease=DEFAULT_REQUEST_LEASE):
+        """
+        Start the request with this idempotency key. Returns (True, None) when
+        the caller should run it, (False, response) when it already finished,
+        and (False, None) while another caller is still running it. A claim
+        that is not finished within `lease` seconds can be taken over; keyed
+        mutations the first attempt already made are not repeated.
+        """
+        def apply(conn):
+            now = time.time()
+            self._claims += 1
+            if self._claims % 100 == 0:
+                self._prune_requests(conn, now)
+            row = conn.execute(
+                "SELECT response, claimed_until FROM ledger_requests WHERE request_key = ?", (request_key,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO ledger_requests (request_key, claimed_until, created_at) VALUES (?, ?, ?)",
+                    (request_key, now + lease, now)
+                )
+                return True, None
+            response, claimed_until = row
+            if response is not None:
+                return False, json.loads(response)
+            if claimed_until is None or claimed_until < now:
+                conn.execute(
+                    "UPDATE ledger_requests SET claimed_until = ? WHERE request_key = ?",
+                    (now + lease, request_key)
+                )
+                return True, None
+            return False, None
+        return self._write(apply)
+
+    def finish_request(self, request_key, response):
+        """Store the response that replays of this key get from now on"""
+        def apply(conn):
+            conn.execute(
+                "UPDATE ledger_requests SET response = ?, claimed_until = NULL WHERE request_key = ?",
+                (json.dumps(response), request_key)
+            )
+        self._write(apply)
+
+    def release_request(self, request_key):
+        """Give up a claim without a response so the next retry runs the request again"""
+        def apply(conn):
+            conn.execute("DELETE FROM ledger_requests WHERE request_key = ? AND result IS NULL", (request_key,))
+            conn.execute("UPDATE ledger_requests SET claimed_until = NULL WHERE request_key = ?", (request_key,))
+        self._write(apply)
+
+    def balances(self):
+        """All (user_address, tokens) pairs"""
+        return self._conn().execute("SELECT user_address, tokens FROM balances").fetchall()
+
+    def user_count(self):
+        return self.stats()["total_users"]
+
+    def stats(self):
+        """Running totals plus users at or above each tier threshold, without scanning balances"""
+        conn = self._conn()
+        # Both reads see one snapshot even while other processes write
+        conn.execute("BEGIN")
+        try:
+            totals = dict(conn.execute("SELECT key, value FROM ledger_stats").fetchall())
+            tier_counts = dict(conn.execute("SELECT threshold, users FROM tier_counts").fetchall())
+        finally:
+            conn.execute("COMMIT")
+        return {
+            "total_users": totals.get("total_users", 0),
+            "total_tokens": totals.get("total_tokens", 0),
+            "tier_counts": tier_counts
+        }
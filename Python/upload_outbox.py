@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+PENDING = "pending"
+COMPLETE = "complete"
+FAILED = "failed"
+
+
+class UploadOutbox:
+    """
+    Durable queue of certificate uploads. The rendered PNG is written to
+    `blob_dir` under its SHA-256 and the task to SQLite before anything is sent
+    to Pinata, so a gateway failure leaves work to resume instead of work to
+    redo. Each step (pin image, pin metadata, complete the record) stores its
+    result as it finishes and is skipped on retry, and an image whose content
+    hash was already pinned by another task is not uploaded again.
+
+    The request thread normally runs a task straight away with process(); a
+    background drainer retries the ones that failed with exponential backoff
+    and hands a task to `on_failed` once `max_attempts` is used up.
+
+    `pin_image(png_bytes, file_name)` and `pin_metadata(metadata)` return CIDs;
+    `build_metadata(template, image_cid)` fills the image into the stored
+    metadata template. They are plain callables for process() / start() and
+    coroutine functions for process_async() / run_async().
+    """
+
+    def __init__(self, db_path, blob_dir, pin_image, pin_metadata, build_metadata, on_complete, on_failed,
+                 max_attempts=8, backoff=2.0, max_backoff=300.0, lease=120.0):
+        self.db_path = db_path
+        self.blob_dir = blob_dir
+        self.pin_image = pin_image
+        self.pin_metadata = pin_metadata
+        self.build_metadata = build_metadata
+        self.on_complete = on_complete
+        self.on_failed = on_failed
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self._local = threading.local()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        os.makedirs(blob_dir, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS upload_tasks (
+                task_id TEXT PRIMARY KEY,
+                record_id INTEGER,
+                content_hash TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                context TEXT NOT NULL,
+                status TEXT NOT NULL,
+                image_cid TEXT,
+                metadata_cid TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                claimed_until REAL,
+                last_error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_upload_tasks_due ON upload_tasks (status, next_attempt_at);
+            CREATE INDEX IF NOT EXISTS idx_upload_tasks_hash ON upload_tasks (content_hash);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.blob_dir, f"{content_hash}.png")
+
+    @staticmethod
+    def _to_dict(row):
+        task = dict(row)
+        task["metadata"] = json.loads(task["metadata"])
+        task["context"] = json.loads(task["context"])
+        return task
+
+    def _update(self, task_id, **fields):
+        fields["updated_at"] = datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.execute(
+                f"UPDATE upload_tasks SET {', '.join(f'{key} = ?' for key in fields)} WHERE task_id = ?",
+                tuple(fields.values()) + (task_id,)
+            )
+
+    def enqueue(self, png_bytes, file_name, metadata, record_id=None, context=None):
+        """
+        Persist the PNG and the task and return the task id. The drainer leaves a
+        new task alone for `lease` seconds so the caller can run it first.
+        """
+        content_hash = hashlib.sha256(png_bytes).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(png_bytes)
+            os.replace(tmp_path, blob_path)
+
+        task_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO upload_tasks (task_id, record_id, content_hash, file_name, metadata, context, "
+                "status, next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, record_id, content_hash, file_name, json.dumps(metadata), json.dumps(context or {}),
+                 PENDING, time.time() + self.lease, now, now)
+            )
+        return task_id
+
+    def get(self, task_id):
+        row = self._conn().execute("SELECT * FROM upload_tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def _claim(self, task_id):
+        """Lease a pending task to this caller; None if it is finished or another worker holds it"""
+        now = time.time()
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "UPDATE upload_tasks SET claimed_until = ? WHERE task_id = ? AND status = ? "
+                "AND (claimed_until IS NULL OR claimed_until < ?)",
+                (now + self.lease, task_id, PENDING, now)
+            )
+        return self.get(task_id) if cursor.rowcount else None
+
+    def _known_image_cid(self, content_hash):
+        row = self._conn().execute(
+            "SELECT image_cid FROM upload_tasks WHERE content_hash = ? AND image_cid IS NOT NULL LIMIT 1",
+            (content_hash,)
+        ).fetchone()
+        return row["image_cid"] if row else None
+
+    def _read_blob(self, task):
+        with open(self._blob_path(task["content_hash"]), "rb") as f:
+            return f.read()
+
+    def _discard_blob(self, task):
+        still_needed = self._conn().execute(
+            "SELECT 1 FROM upload_tasks WHERE content_hash = ? AND status = ? AND task_id != ? LIMIT 1",
+            (task["content_hash"], PENDING, task["task_id"])
+        ).fetchone()
+        if not still_needed:
+            try:
+                os.remove(self._blob_path(task["content_hash"]))
+            except FileNotFoundError:
+                pass
+
+    def _record_failure(self, task, error):
+        """Schedule the next attempt, or give up; returns True when the task is now failed"""
+        attempts = task["attempts"] + 1
+        if attempts >= self.max_attempts:
+            self._update(task["task_id"], status=FAILED, attempts=attempts, last_error=str(error), claimed_until=None)
+            return True
+        delay = min(self.max_backoff, self.backoff * (2 ** (attempts - 1)))
+        self._update(task["task_id"], attempts=attempts, last_error=str(error),
+                     next_attempt_at=time.time() + delay, claimed_until=None)
+        return False
+
+    def _finish(self, task):
+        self._update(task["task_id"], status=COMPLETE, last_error=None, claimed_until=None)
+        self._discard_blob(task)
+
+    def process(self, task_id):
+        """Run (or resume) one task now; returns the task as it stands afterwards"""
+        task = self._claim(task_id)
+        if task is None:
+            return self.get(task_id)
+        try:
+            if not task["image_cid"]:
+                task["image_cid"] = (self._known_image_cid(task["content_hash"])
+                                     or self.pin_image(self._read_blob(task), task["file_name"]))
+                self._update(task_id, image_cid=task["image_cid"])
+            if not task["metadata_cid"]:
+                task["metadata_cid"] = self.pin_metadata(self.build_metadata(task["metadata"], task["image_cid"]))
+                self._update(task_id, metadata_cid=task["metadata_cid"])
+            self.on_complete(task)
+        except Exception as e:
+            if self._record_failure(task, e):
+                self.on_failed(task)
+                self._discard_blob(task)
+        else:
+            self._finish(task)
+        return self.get(task_id)
+
+    async def process_async(self, task_id):
+        """process() for coroutine pin / metadata callables; SQLite and disk work runs on a thread"""
+        task = await asyncio.to_thread(self._claim, task_id)
+        if task is None:
+            return await asyncio.to_thread(self.get, task_id)
+        try:
+            if not task["image_cid"]:
+                task["image_cid"] = await asyncio.to_thread(self._known_image_cid, task["content_hash"])
+                if not task["image_cid"]:
+                    png_bytes = await asyncio.to_thread(self._read_blob, task)
+                    task["image_cid"] = await self.pin_image(png_bytes, task["file_name"])
+                await asyncio.to_thread(self._update, task_id, image_cid=task["image_cid"])
+            if not task["metadata_cid"]:
+                task["metadata_cid"] = await self.pin_metadata(self.build_metadata(task["metadata"], task["image_cid"]))
+                await asyncio.to_thread(self._update, task_id, metadata_cid=task["metadata_cid"])
+            await asyncio.to_thread(self.on_complete, task)
+        except Exception as e:
+            if await asyncio.to_thread(self._record_failure, task, e):
+                await asyncio.to_thread(self.on_failed, task)
+                await asyncio.to_thread(self._discard_blob, task)
+        else:
+            await asyncio.to_thread(self._finish, task)
+        return await asyncio.to_thread(self.get, task_id)
+
+    def due(self, limit=20):
+        """Ids of pending tasks whose next attempt is due and that nobody holds"""
+        now = time.time()
+        rows = self._conn().execute(
+            "SELECT task_id FROM upload_tasks WHERE status = ? AND next_attempt_at <= ? "
+            "AND (claimed_until IS NULL OR claimed_until < ?) ORDER BY next_attempt_at LIMIT ?",
+            (PENDING, now, now, limit)
+        ).fetchall()
+        return [row["task_id"] for row in rows]
+
+    def start(self, interval=5.0):
+        """Drain due tasks on a background thread"""
+        def run():
+            while True:
+                try:
+                    for task_id in self.due():
+                        self.process(task_id)
+                except Exception:
+                    # A locked database or a failing callback is retried next interval
+                    pass
+                time.sleep(interval)
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=run, name="upload-outbox", daemon=True)
+                self._thread.start()
+        return self
+
+    async def run_async(self, interval=5.0):
+        """Drain due tasks forever on the running event loop, for process_async() users"""
+        while True:
+            try:
+                for task_id in await asyncio.to_thread(self.due):
+                    await self.process_async(task_id)
+            except Exception:
+                pass
+            await asyncio.sleep(interval)
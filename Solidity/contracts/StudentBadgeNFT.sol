@@ -39,6 +39,37 @@ contract StudentBadgeNFT is ERC721URIStorage, Ownable {
         string memory badgeType,
         string memory tokenURI
     ) public onlyOwner returns (uint256) {
+        return _mintBadge(recipient, badgeType, tokenURI);
+    }
+
+    /**
+     * @dev Mints one badge per recipient in a single transaction, emitting
+     * BadgeMinted for each token exactly like mintBadge does.
+     * Only the owner can call this.
+     */
+    function mintBadgeBatch(
+        address[] calldata recipients,
+        string[] calldata badgeTypeNames,
+        string[] calldata tokenURIs
+    ) public onlyOwner returns (uint256[] memory) {
+        require(
+            recipients.length == badgeTypeNames.length &&
+                recipients.length == tokenURIs.length,
+            "Array length mismatch"
+        );
+
+        uint256[] memory newItemIds = new uint256[](recipients.length);
+        for (uint256 i = 0; i < recipients.length; i++) {
+            newItemIds[i] = _mintBadge(recipients[i], badgeTypeNames[i], tokenURIs[i]);
+        }
+        return newItemIds;
+    }
+
+    function _mintBadge(
+        address recipient,
+        string memory badgeType,
+        string memory tokenURI
+    ) internal returns (uint256) {
         _tokenIds += 1;
         uint256 newItemId = _tokenIds;
 
@@ -0,0 +1,43 @@
+// benchmarkBatchMint.js - Compares gas for N single mints against one mintBadgeBatch call
+// Usage: BATCH_SIZE=50 npx hardhat run scripts/benchmarkBatchMint.js
+const { ethers } = require("hardhat");
+
+async function deployFresh(owner) {
+    const BadgeNFT = await ethers.getContractFactory("StudentBadgeNFT");
+    const badgeContract = await BadgeNFT.deploy(owner.address);
+    await badgeContract.waitForDeployment();
+    return badgeContract;
+}
+
+async function main() {
+    const batchSize = parseInt(process.env.BATCH_SIZE || "25", 10);
+    const [deployer, ...others] = await ethers.getSigners();
+    const recipients = Array.from({ length: batchSize }, (_, i) => others[i % others.length].address);
+    const badgeTypes = recipients.map(() => "Newbie");
+    const tokenURIs = recipients.map((_, i) => `https://example.com/metadata/bench-${i}.json`);
+
+    // One transaction per badge, the way StudentNFTAPI mints today
+    const single = await deployFresh(deployer);
+    let singleGas = 0n;
+    for (let i = 0; i < batchSize; i++) {
+        const tx = await single.mintBadge(recipients[i], badgeTypes[i], tokenURIs[i]);
+        const receipt = await tx.wait();
+        singleGas += receipt.gasUsed;
+    }
+
+    // The same badges in one mintBadgeBatch transaction
+    const batched = await deployFresh(deployer);
+    const batchTx = await batched.mintBadgeBatch(recipients, badgeTypes, tokenURIs);
+    const batchReceipt = await batchTx.wait();
+    const batchGas = batchReceipt.gasUsed;
+
+    console.log(`📊 Minting ${batchSize} badges`);
+    console.log(`   Single mints: ${singleGas} gas in ${batchSize} transactions (${singleGas / BigInt(batchSize)} per badge)`);
+    console.log(`   Batch mint:   ${batchGas} gas in 1 transaction (${batchGas / BigInt(batchSize)} per badge)`);
+    console.log(`   Saved:        ${singleGas - batchGas} gas (${Number((singleGas - batchGas) * 10000n / singleGas) / 100}%)`);
+}
+
+main().catch((error) => {
+    console.error(error);
+    process.exitCode = 1;
+});
@@ -4,6 +4,8 @@ const AdminDashboard = () => {
   // Configuration
   const API_BASE_URL = "http://localhost:8000";  //5000 for FlaskAPI
   const BLOCKCHAIN_RPC = "http://127.0.0.1:8545";
+  const UPLOAD_POLL_INTERVAL_MS = 2000;
+  const UPLOAD_WAIT_TIMEOUT_MS = 120000;
   
   const BADGE_TOKEN_REQUIREMENTS = {
     "Newbie": 10,
@@ -123,6 +125,22 @@ const AdminDashboard = () => {
     return eligibleBadges[0];
   };
 
+  // uploadMetadata answers 202 while Pinata is slow; poll status_url until the metadata is pinned
+  const waitForUpload = async (statusUrl) => {
+    const deadline = Date.now() + UPLOAD_WAIT_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, UPLOAD_POLL_INTERVAL_MS));
+      const response = await fetch(`${API_BASE_URL}${statusUrl}`);
+      if (!response.ok) continue;
+      const status = await response.json();
+      if (status.status === 'complete') return status;
+      if (status.status === 'failed') {
+        throw new Error(`Metadata upload failed: ${status.last_error}`);
+      }
+    }
+    throw new Error('Metadata upload is still pending, check the upload status later');
+  };
+
   const mintBadgeForUser = async (userAddress, badgeType, studentName, className, university) => {
     try {
       const metadataPayload = {
@@ -143,7 +161,10 @@ const AdminDashboard = () => {
         return { success: false, error: `Metadata upload failed: ${await metadataResponse.text()}` };
       }
       
-      const metadataResult = await metadataResponse.json();
+      let metadataResult = await metadataResponse.json();
+      if (metadataResponse.status === 202) {
+        metadataResult = await waitForUpload(metadataResult.status_url);
+      }
       const metadataUri = metadataResult.metadata_uri;
       
       const mintPayload = {